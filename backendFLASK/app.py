@@ -1,83 +1,208 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
-from models import db, Stock, Account, Portfolio, Transactions
-import yfinance as yf
+from models import db, Stock, Account, Portfolio, Transactions, Job, DEFAULT_ACCOUNT_ID, DEFAULT_STARTING_BALANCE
+from quotes import QuoteCache
+from market_data import create_provider
+from profiling import InstrumentedProvider, init_profiling
+from performance import portfolio_value_series
+from risk import close_matrix, portfolio_risk
+from backtest import BacktestError, close_frame, parse_request, run_backtest, scenario_symbols
+from charts import DEFAULT_MAX_POINTS, DEFAULT_RANGE, MAX_POINTS_LIMIT, RANGES, RESOLUTION_NAMES, SOURCE_RESOLUTION, candles, \
+    choose_resolution, coarsest, line, range_days, range_start, resample_ohlc
+from cache import ResponseCache, current_version, symbol_version
+from responses import dumps, gzip_body, json_array_chunks, json_stream, make_etag, not_modified
+from price_store import price_start_dates, refresh_prices, stale_symbols, traded_symbols, upsert_closes
+from migrations import run_migrations
+from jobs import JobRunner, cancel_job, new_owner_id, update_job
+from warmup import start_warmup, warmup_status
+from ledger import rebuild_ledger, verify_ledger, realized_pnl_summary
+from stream import StreamHubs
+from trading import TradeError, adjust_balance, apply_buy, apply_sell, run_with_retry
+from sqlalchemy import and_, or_, select
+import click
+import json
 import pandas as pd
+import base64
+import os
+import binascii
+import time
 from datetime import datetime, timedelta, date, timezone
-from collections import defaultdict
-from copy import deepcopy
 
 app = Flask(__name__)
 CORS(app)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stocks.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///stocks.db')
+app.config['QUOTE_CACHE_TTL'] = 60  # seconds a quote is reused before going back upstream
+app.config['QUOTE_CACHE_MAX_SYMBOLS'] = 500
+# ASGI mode (asgi.py): market-data calls in flight at once. Blocking ones (yfinance) each hold a thread,
+# so it also sizes the pools they and the views that load history() run on
+app.config['QUOTE_MAX_CONCURRENT'] = int(os.environ.get('QUOTE_MAX_CONCURRENT', 32))
+app.config['WARMUP_ON_START'] = os.environ.get('WARMUP_ON_START', '1') != '0'
+app.config['STREAM_POLL_INTERVAL'] = 15  # seconds between shared price polls for /api/stream
+app.config['RISK_BENCHMARK'] = 'SPY'  # default benchmark for betas in /api/portfolio/risk; its closes are stored like any symbol
+# 'yfinance' for live data, 'synthetic' for a seeded offline market (benchmarks, load tests, CI)
+app.config['MARKET_DATA_PROVIDER'] = os.environ.get('MARKET_DATA_PROVIDER', 'yfinance')
+app.config['SYNTHETIC_MARKET'] = {
+    'seed': int(os.environ.get('SYNTHETIC_SEED', 0)),
+    'latency': float(os.environ.get('SYNTHETIC_LATENCY', 0.0)),  # seconds added to every upstream call
+    'error_rate': float(os.environ.get('SYNTHETIC_ERROR_RATE', 0.0))  # fraction of upstream calls that fail
+}
+app.config['CHART_CACHE_TTL'] = 300  # seconds upstream chart bars are reused while no new closes arrive
+# ASGI mode (asgi.py): threads Flask views and database work run on, and threads idle event streams wait on
+app.config['DB_THREADS'] = int(os.environ.get('DB_THREADS', 8))
+app.config['STREAM_THREADS'] = int(os.environ.get('STREAM_THREADS', 64))
+# Processes a /api/backtest sweep is spread over
+app.config['BACKTEST_WORKERS'] = int(os.environ.get('BACKTEST_WORKERS', os.cpu_count() or 1))
+# PROFILING=1 adds Server-Timing headers, /metrics and ?profile=1 flamegraphs (see profiling.py)
+app.config['PROFILING'] = os.environ.get('PROFILING', '0') == '1'
+if os.environ.get('PROFILE_DIR'):
+    app.config['PROFILE_DIR'] = os.environ['PROFILE_DIR']
 db.init_app(app)
 
-with app.app_context():
-    db.create_all()
-    # Initialize account with $100,000 if it doesn't exist
-    if not Account.query.first():
-        account = Account(balance=100000.0)
-        db.session.add(account)
-        db.session.commit()
-
-    # Get all stocks after ensuring database schema is correct
-    ALL_TIME_STOCKS = [s.symbol for s in Stock.query.all()] 
-
-    if ALL_TIME_STOCKS:
-        # Only download price data if we have stocks in the database
-        price_data = yf.download(ALL_TIME_STOCKS, period='1mo')['Close']
-        
-        for date, i in price_data.iterrows():
-            date_str = date.strftime('%Y-%m-%d')
-            for symbol in ALL_TIME_STOCKS:
-                price = i.get(symbol)
-
-                if pd.isna(price):
-                    continue
+# Every quote and price download goes through this provider
+market_data = create_provider(
+    app.config['MARKET_DATA_PROVIDER'],
+    **(app.config['SYNTHETIC_MARKET'] if app.config['MARKET_DATA_PROVIDER'] == 'synthetic' else {})
+)
+if app.config['PROFILING']:
+    market_data = InstrumentedProvider(market_data)
+    init_profiling(app)
+
+# Shared quote cache in front of every quote lookup
+quote_cache = QuoteCache(market_data.info, ttl=app.config['QUOTE_CACHE_TTL'], max_symbols=app.config['QUOTE_CACHE_MAX_SYMBOLS'],
+                         source_async=market_data.info_async if market_data.native_async else None,
+                         max_concurrent=app.config['QUOTE_MAX_CONCURRENT'])
+
+# Identifies this worker process in cross-worker lock rows
+WORKER_ID = new_owner_id()
+
+# Backtest pool workers re-import the script that was run as __mp_main__; they only need backtest.py,
+# so they skip the database setup and the warm-up
+if __name__ != '__mp_main__':
+    with app.app_context():
+        db.create_all()
+        run_migrations()
+        # Requests that don't name an account act on the default one
+        if not db.session.get(Account, DEFAULT_ACCOUNT_ID):
+            db.session.add(Account(id=DEFAULT_ACCOUNT_ID, balance=DEFAULT_STARTING_BALANCE,
+                                   starting_balance=DEFAULT_STARTING_BALANCE))
+            db.session.commit()
 
-                exists = Portfolio.query.filter_by(symbol = symbol, date = date_str).first()
+        # Symbols to warm: everything ever traded, read from the database rather than module state,
+        # plus the risk benchmark once there is a portfolio to compare against it
+        warmup_symbols = traded_symbols()
+        if warmup_symbols:
+            warmup_symbols.add(app.config['RISK_BENCHMARK'])
+        warmup_symbols = sorted(warmup_symbols)
 
-                if not exists:
-                    db.session.add(Portfolio(symbol = symbol, date = date_str, closing_price = price))
-    db.session.commit()
+    # Price backfill runs in the background so the API is up immediately; see /api/ready.
+    if warmup_symbols and app.config['WARMUP_ON_START']:
+        start_warmup(app, warmup_symbols, WORKER_ID, download=market_data.closes)
 
-def update_stock_closing_prices(symbol):
+def update_stock_closing_prices(symbols):
     """
-    Fetches closing prices of stocks from yfinance for the graph and stores in the portfolio database
+    Fetches closing prices of stocks from the market data provider for the graph and stores in the portfolio database.
+    All symbols share one bulk download per distinct missing date range.
     """
+    summary = refresh_prices(price_start_dates(symbols), download=market_data.closes)
     
-    price_data = yf.download(symbol, period='1mo')['Close']
+    # Use the live price for today until the real close is downloaded
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    live_prices = {}
+    for symbol, info in quote_cache.get_many(symbols).items():
+        current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
+        if current_price:
+            live_prices[symbol] = current_price
+    if live_prices:
+        upsert_closes(pd.DataFrame(live_prices, index=[today_str]), overwrite=False)
 
-    for date, i in price_data.iterrows():
-        date_str = date.strftime('%Y-%m-%d')
+    db.session.commit()
+    return summary
 
-        price = i.get(symbol)
-        if pd.isna(price):
-            continue
+def run_price_refresh(job):
+    """
+    Background job: bring the closes of every traded symbol (and the risk benchmark) up to date;
+    only the dates each symbol is missing are downloaded
+    """
+    symbols = sorted(traded_symbols() | {app.config['RISK_BENCHMARK']})
+    job.total = len(symbols)
+    db.session.commit()
 
-        exists = Portfolio.query.filter_by(symbol = symbol, date = date_str).first()
+    summary = update_stock_closing_prices(symbols)
+    job.done = len(symbols)
+    return {"symbols": symbols, **summary}
+
+def run_backtest_job(job):
+    """Background job: simulate a /api/backtest request's scenarios against the stored closes"""
+    params = json.loads(job.params)
+    scenarios = params['scenarios']
+    frame = close_frame(close_matrix, scenario_symbols(scenarios), params['start'], params['end'])
+    return run_backtest(frame, scenarios, workers=app.config['BACKTEST_WORKERS'],
+                        progress=lambda done, total: update_job(job, done, total))
+
+job_runner = JobRunner(app)
+job_runner.register('price_refresh', run_price_refresh)
+# Backtests get their own runner thread so a long sweep never holds up a price refresh
+backtest_runner = JobRunner(app)
+backtest_runner.register('backtest', run_backtest_job)
+
+def portfolio_snapshot(account_id):
+    """Account balance and holdings marked to market, as pushed to /api/stream clients"""
+    with app.app_context():
+        account = db.session.get(Account, account_id)
+        stocks = Stock.query.filter_by(account_id=account_id).all()
+        infos = quote_cache.get_many([s.symbol for s in stocks])
+
+        holdings = {}
+        total_invested = 0.0
+        total_value = 0.0
+        for s in stocks:
+            info = infos.get(s.symbol, {})
+            price = info.get('currentPrice', info.get('regularMarketPrice', 0)) or s.purchase_price
+            market_value = price * s.quantity
+            total_invested += s.purchase_price * s.quantity
+            total_value += market_value
+            holdings[s.symbol] = {
+                'quantity': s.quantity,
+                'purchase_price': round(s.purchase_price, 4),
+                'current_price': price,
+                'market_value': round(market_value, 2),
+                'unrealized_pnl': round(market_value - s.purchase_price * s.quantity, 2)
+            }
+
+        return {
+            'balance': round(account.balance, 2) if account else 0.0,
+            'total_invested': round(total_invested, 2),
+            'total_value': round(total_value, 2),
+            'unrealized_pnl': round(total_value - total_invested, 2),
+            'holdings': holdings
+        }
+
+# One shared price-polling loop per account behind its /api/stream clients
+stream_hubs = StreamHubs(portfolio_snapshot, interval=app.config['STREAM_POLL_INTERVAL'])
+
+@app.before_request
+def select_account():
+    """
+    The account a request acts on: ?account_id= or the X-Account-Id header, else the default account.
+    Every holdings, transaction and portfolio query below is filtered on it.
+    """
+    raw = request.args.get('account_id') or request.headers.get('X-Account-Id')
+    try:
+        g.account_id = int(raw) if raw else DEFAULT_ACCOUNT_ID
+    except ValueError:
+        return jsonify({"error": "account_id must be an integer"}), 400
 
-        if not exists:
-            db.session.add(Portfolio(symbol = symbol, date = date_str, closing_price = price))    
-    
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    exists_today = Portfolio.query.filter_by(symbol=symbol, date=today_str).first()
-    if not exists_today:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        current_price = info.get('currentPrice', info.get('regularMarketPrice', None))
-        if current_price:
-            db.session.add(Portfolio(symbol=symbol, date=today_str, closing_price=current_price))
+def current_account():
+    """The request's Account row, or None when it doesn't exist"""
+    return db.session.get(Account, g.account_id)
 
-    db.session.commit()
-    ALL_TIME_STOCKS.append(symbol)
-    return ALL_TIME_STOCKS
+def account_not_found():
+    return jsonify({"error": f"Account {g.account_id} not found"}), 404
     
 @app.route('/api/stocks/<ticker>')
 def get_stock(ticker):
-    stock = yf.Ticker(ticker)
-    data = stock.history(period='5d')
+    data = market_data.history(ticker, period='5d')
 
     if data.empty:
         return jsonify({'error': 'No data found for this ticker'}), 404
@@ -89,8 +214,7 @@ def search_stock(query):
     """Search for stocks by ticker or company name"""
     try:
         # Try as ticker first
-        ticker = yf.Ticker(query.upper())
-        info = ticker.info
+        info = quote_cache.get_info(query.upper())
         if info and 'symbol' in info:
             return jsonify({
                 'symbol': info.get('symbol', query.upper()),
@@ -113,21 +237,152 @@ def search_stock(query):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ready')
+def get_readiness():
+    """Readiness probe: 503 while the startup price warm-up is still running"""
+    status = warmup_status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/quotes')
+def get_quotes():
+    """
+    Batch quotes plus mark-to-market holdings in one response.
+    Pass ?symbols=A,B,C to quote specific symbols, otherwise every current holding is quoted.
+    """
+    stocks = Stock.query.filter_by(account_id=g.account_id).all()
+    symbols_param = request.args.get('symbols', '')
+    if symbols_param:
+        symbols = [s.strip().upper() for s in symbols_param.split(',') if s.strip()]
+    else:
+        symbols = [s.symbol for s in stocks]
+
+    infos = quote_cache.get_many(symbols)
+    quotes = {}
+    for symbol, info in infos.items():
+        quotes[symbol] = {
+            'symbol': symbol,
+            'name': info.get('longName', info.get('shortName', 'Unknown')),
+            'current_price': info.get('currentPrice', info.get('regularMarketPrice', 0)) or 0,
+            'previous_close': info.get('previousClose', 0),
+            'currency': info.get('currency', 'USD')
+        }
+
+    holdings = []
+    total_invested = 0.0
+    total_value = 0.0
+    for s in stocks:
+        if s.symbol not in quotes:
+            continue
+        # Fall back to the purchase price when no live price is available, same as the frontend did
+        price = quotes[s.symbol]['current_price'] or s.purchase_price
+        cost_basis = s.purchase_price * s.quantity
+        market_value = price * s.quantity
+        total_invested += cost_basis
+        total_value += market_value
+
+        holding = s.to_dict()
+        holding['current_price'] = price
+        holding['market_value'] = round(market_value, 2)
+        holding['unrealized_pnl'] = round(market_value - cost_basis, 2)
+        holdings.append(holding)
+
+    return jsonify({
+        'quotes': quotes,
+        'holdings': holdings,
+        'total_invested': round(total_invested, 2),
+        'total_value': round(total_value, 2),
+        'unrealized_pnl': round(total_value - total_invested, 2)
+    }), 200
+
+@app.route('/api/stream')
+def stream_portfolio():
+    """
+    Server-Sent Events: a 'snapshot' of balance and holdings on connect, then 'update' diffs
+    from the shared price poll and 'trade' events as orders are filled
+    """
+    stream_hub = stream_hubs.get(g.account_id)
+    subscriber = stream_hub.subscribe()
+
+    def events():
+        try:
+            while True:
+                messages = stream_hub.next_messages(subscriber, timeout=15)
+                # A comment line keeps idle connections open through proxies
+                yield ''.join(messages) if messages else ': keepalive\n\n'
+        finally:
+            stream_hub.unsubscribe(subscriber)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/api/quotes/cache')
+def get_quote_cache_stats():
+    """Hit/miss counters for the shared quote cache"""
+    return jsonify(quote_cache.stats()), 200
+
 @app.route('/api/account')
 def get_account():
     """Get account balance"""
-    account = Account.query.first()
+    account = current_account()
     if not account:
-        account = Account(balance=100000.0)
-        db.session.add(account)
-        db.session.commit()
+        return account_not_found()
     return jsonify(account.to_dict()), 200
 
+@app.route('/api/accounts', methods=['POST'])
+def create_account():
+    """Open a new paper-trading account: {"starting_balance": 50000} (default 100,000)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        starting_balance = float(data.get("starting_balance", DEFAULT_STARTING_BALANCE))
+    except (ValueError, TypeError):
+        return jsonify({"error": "Invalid starting balance"}), 400
+    if starting_balance < 0:
+        return jsonify({"error": "Starting balance cannot be negative"}), 400
+
+    account = Account(balance=starting_balance, starting_balance=starting_balance)
+    db.session.add(account)
+    db.session.commit()
+    return jsonify(account.to_dict()), 201
+
+# Encoded bodies of the read endpoints below, valid until a trade or price ingestion bumps the data version
+response_cache = ResponseCache()
+# Chart bodies per (symbol, range, resolution), and the upstream bars they are built from
+chart_cache = ResponseCache(max_entries=512)
+chart_bars_cache = ResponseCache(max_entries=128)
+
+def versioned_response(build, scope=''):
+    """
+    JSON response from build() (byte chunks), cached per URL at the current data version.
+    The version is the ETag too: a client that already has it gets a 304 and nothing is read
+    or rebuilt. scope is anything else the body depends on, e.g. the current day.
+    The body is joined in memory on purpose, since the cache keeps it whole; build() still never
+    holds the rows as dicts, and the one list without a bound (transactions) is paged. The gzipped body is
+    cached next to it, so a hit is never compressed again.
+    """
+    version = current_version(g.account_id)
+    # The URL is part of the validator so an ETag only matches the representation it came with
+    etag = make_etag(f"{g.account_id}:{version}:{scope}:{request.full_path}")
+    response = not_modified(etag)
+    if response is None:
+        key = (g.account_id, request.path, tuple(sorted(request.args.items(multi=True))), scope)
+        body = response_cache.get_or_build(key, version, lambda: b''.join(build()))
+        gzipped = lambda: response_cache.get_or_build(key + ('gzip',), version, lambda: gzip_body(body))
+        response = json_stream([body], etag=etag, gzipped=gzipped)
+    # The account can come from a header, so caches must not share bodies across it
+    response.vary.add('X-Account-Id')
+    return response
+
 @app.route('/api/stocks', methods=['GET'])
 def get_all_stocks():
-    stocks = Stock.query.all()
-    stock_list = [s.to_dict() for s in stocks]
-    return jsonify(stock_list), 200
+    def build():
+        # Plain tuples: no ORM objects are built for the rows
+        rows = db.session.execute(
+            select(Stock.id, Stock.symbol, Stock.name, Stock.purchase_price, Stock.quantity)
+            .where(Stock.account_id == g.account_id).order_by(Stock.id)
+        ).all()
+        return json_array_chunks(rows, lambda r: {
+            "id": r[0], "symbol": r[1], "name": r[2], "purchase_price": r[3], "quantity": r[4]
+        })
+    return versioned_response(build)
 
 @app.route('/api/stocks', methods=['POST'])
 def add_stock():
@@ -144,19 +399,16 @@ def add_stock():
         if quantity <= 0:
             return jsonify({"error": "Quantity must be greater than 0"}), 400
 
-        # Get current price from Yahoo Finance if not provided
+        # Get current price from the market data provider if not provided
         purchase_price = data.get("purchase_price")
         if not purchase_price:
-            stock_ticker = yf.Ticker(symbol)
-            info = stock_ticker.info
+            info = quote_cache.get_info(symbol)
             current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
             
             if current_price == 0:
                 # Fallback to recent history
-                hist = stock_ticker.history(period='1d')
-                if not hist.empty:
-                    current_price = float(hist['Close'].iloc[-1])
-                else:
+                current_price = market_data.last_close(symbol)
+                if not current_price:
                     return jsonify({"error": "Could not retrieve current price for this stock"}), 400
             
             purchase_price = current_price
@@ -173,12 +425,10 @@ def add_stock():
         total_cost = purchase_price * quantity
         
         # Check account balance
-        account = Account.query.first()
+        account = current_account()
         if not account:
-            account = Account(balance=100000.0)
-            db.session.add(account)
-            db.session.commit()
-            
+            return account_not_found()
+
         if account.balance < total_cost:
             return jsonify({
                 "error": f"Insufficient funds. Cost: ${total_cost:.2f}, Available: ${account.balance:.2f}"
@@ -189,45 +439,14 @@ def add_stock():
     except Exception as e:
         return jsonify({"error": f"Error fetching stock data: {str(e)}"}), 500
 
-    # Update account balance
-    account.balance -= total_cost
-
-    stock = Stock.query.filter_by(symbol=symbol).first()
-    if stock:
-        stock.quantity += quantity
-        # Update purchase_price as weighted average
-        total_shares = stock.quantity
-        old_cost = (stock.quantity - quantity) * stock.purchase_price
-        new_total_cost = old_cost + total_cost
-        stock.purchase_price = new_total_cost / total_shares
-        
-        if name:
-            stock.name = name
-
-        message = f"Updated stock '{symbol}', new quantity: {stock.quantity}"
-    else:
-        stock = Stock(
-            symbol=symbol,
-            purchase_price=purchase_price,
-            quantity=quantity,
-            name=name
+    try:
+        stock, transaction, message = run_with_retry(
+            lambda: apply_buy(account, symbol, quantity, purchase_price, name)
         )
-        db.session.add(stock)
-        message = f"Added new stock '{symbol}' with quantity {quantity}"
-
-    # Create single transaction record
-    transaction = Transactions(
-        symbol=symbol,
-        type='BUY',
-        quantity=quantity,
-        purchase_price=purchase_price,
-        total_amount=total_cost,
-        date=datetime.now(timezone.utc)
-    )
-    db.session.add(transaction)
-
-    db.session.commit()
+    except TradeError as e:
+        return jsonify({"error": str(e)}), 400
 
+    stream_hubs.publish(account.id, 'trade', {"symbol": symbol, "side": "BUY", "quantity": quantity, "price": purchase_price})
     return jsonify({
         "message": message,
         "stock": stock.to_dict(),
@@ -245,7 +464,11 @@ def sell_stock():
     if not symbol:
         return jsonify({"error": "No symbol provided"}), 400
 
-    stock = Stock.query.filter_by(symbol=symbol).first()
+    account = current_account()
+    if not account:
+        return account_not_found()
+
+    stock = Stock.query.filter_by(account_id=account.id, symbol=symbol).first()
     if not stock:
         return jsonify({"error": f"Stock with symbol '{symbol}' not found"}), 404
 
@@ -265,259 +488,445 @@ def sell_stock():
 
     # Get current market price for selling
     try:
-        stock_ticker = yf.Ticker(symbol)
-        info = stock_ticker.info
-        current_price = info.get('currentPrice', info.get('regularMarketPrice', 0))
+        current_price = quote_cache.get_price(symbol)
         
         if current_price == 0:
-            hist = stock_ticker.history(period='1d')
-            if not hist.empty:
-                current_price = float(hist['Close'].iloc[-1])
-            else:
+            current_price = market_data.last_close(symbol)
+            if not current_price:
                 return jsonify({"error": "Could not retrieve current price for selling"}), 400
     except Exception as e:
         return jsonify({"error": f"Error fetching current price: {str(e)}"}), 500
 
-    # Calculate sale proceeds
-    sale_proceeds = current_price * quantity_to_sell
-    
-    # Update account balance
-    account = Account.query.first()
-    if not account:
-        account = Account(balance=100000.0)
-        db.session.add(account)
-    
-    account.balance += sale_proceeds
-
-    # Calculate profit/loss
-    purchase_cost = stock.purchase_price * quantity_to_sell
-    profit_loss = sale_proceeds - purchase_cost
-
-    if stock.quantity == quantity_to_sell:
-        # Selling all shares - remove from portfolio
-        # Create single transaction record before deleting stock
-        transaction = Transactions(
-            symbol=symbol,
-            type='SELL',
-            quantity=quantity_to_sell,
-            purchase_price=current_price,
-            total_amount=sale_proceeds,
-            date=datetime.now(timezone.utc)
+    try:
+        transaction, profit_loss, realized_pnl, position_closed = run_with_retry(
+            lambda: apply_sell(account, stock, quantity_to_sell, current_price)
         )
-        db.session.add(transaction)
-        
-        db.session.delete(stock)
-        db.session.commit()
-        return jsonify({
-            "message": f"Sold all {quantity_to_sell} shares of '{symbol}'",
-            "sale_proceeds": round(sale_proceeds, 2),
-            "current_price": current_price,
-            "profit_loss": round(profit_loss, 2),
-            "remaining_balance": round(account.balance, 2),
-            "position_closed": True
-        }), 200
+    except TradeError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stream_hubs.publish(account.id, 'trade', {"symbol": symbol, "side": "SELL", "quantity": quantity_to_sell, "price": current_price})
+    result = {
+        "sale_proceeds": round(transaction.total_amount, 2),
+        "current_price": current_price,
+        "profit_loss": round(profit_loss, 2),
+        "realized_pnl": round(realized_pnl, 2),
+        "remaining_balance": round(account.balance, 2)
+    }
+    if position_closed:
+        result["message"] = f"Sold all {quantity_to_sell} shares of '{symbol}'"
+        result["position_closed"] = True
     else:
-        # Partial sale - update quantity
-        stock.quantity -= quantity_to_sell
-        
-        # Create transaction record for partial sale
-        transaction = Transactions(
-            symbol=symbol,
-            type='SELL',
-            quantity=quantity_to_sell,
-            purchase_price=current_price,
-            total_amount=sale_proceeds,
-            date=datetime.now(timezone.utc)
-        )
-        db.session.add(transaction)
-        
-        db.session.commit()
+        result["message"] = f"Sold {quantity_to_sell} shares of '{symbol}', remaining: {stock.quantity}"
+        result["remaining_shares"] = stock.quantity
+    return jsonify(result), 200
+
+@app.route('/api/orders/batch', methods=['POST'])
+def submit_batch_orders():
+    """
+    Buy and sell several symbols at once: {"orders": [{"symbol": "AAPL", "side": "BUY", "quantity": 5}, ...]}.
+    Prices are fetched concurrently, then every order is applied in one commit or none are.
+    Sell quantity may be "all".
+    """
+    started = time.perf_counter()
+    data = request.get_json() or {}
+    orders = data.get("orders") if isinstance(data, dict) else None
+    if not isinstance(orders, list) or not orders:
+        return jsonify({"error": "A non-empty list of orders is required"}), 400
+
+    # Validate the shape of every order before touching prices or the database
+    parsed = []
+    results = []
+    for order in orders:
+        if not isinstance(order, dict):
+            parsed.append((None, None, None))
+            results.append({"error": "Each order must be an object with symbol, side and quantity"})
+            continue
+        symbol = str(order.get("symbol", "")).upper()
+        side = str(order.get("side", "")).upper()
+        quantity = order.get("quantity")
+        result = {"symbol": symbol, "side": side}
+        if not symbol or side not in ("BUY", "SELL"):
+            result["error"] = "Each order needs a symbol and a side of BUY or SELL"
+        elif not (side == "SELL" and quantity == "all"):
+            try:
+                quantity = int(quantity)
+                if quantity <= 0:
+                    result["error"] = "Quantity must be greater than 0"
+            except (ValueError, TypeError):
+                result["error"] = "Invalid quantity provided"
+        parsed.append((symbol, side, quantity))
+        results.append(result)
+
+    if any("error" in r for r in results):
+        return jsonify({"error": "Invalid orders, nothing was executed", "results": results}), 400
+
+    # Resolve every price concurrently through the quote cache
+    infos = quote_cache.get_many([symbol for symbol, _, _ in parsed])
+    prices = {symbol: info.get('currentPrice', info.get('regularMarketPrice', 0)) or 0 for symbol, info in infos.items()}
+    price_fetch_seconds = time.perf_counter() - started
+
+    db_started = time.perf_counter()
+    account = current_account()
+    if not account:
+        return account_not_found()
+
+    # Walk the orders against projected holdings so every check sees the earlier orders in the batch
+    holdings = {s.symbol: s.quantity for s in
+                Stock.query.filter(Stock.account_id == account.id, Stock.symbol.in_(list(prices))).all()}
+    cash_impact = 0.0
+    for (symbol, side, quantity), result in zip(parsed, results):
+        price = prices.get(symbol, 0)
+        if not price:
+            result["error"] = "Could not retrieve current price for this stock"
+            continue
+        held = holdings.get(symbol, 0)
+        if side == "SELL":
+            quantity = held if quantity == "all" else quantity
+            if quantity <= 0 or held < quantity:
+                result["error"] = f"Cannot sell {quantity} units; only {held} available"
+                continue
+            holdings[symbol] = held - quantity
+            cash_impact += price * quantity
+        else:
+            holdings[symbol] = held + quantity
+            cash_impact -= price * quantity
+        result.update({"quantity": quantity, "price": price, "amount": round(price * quantity, 2)})
+
+    if not any("error" in r for r in results) and account.balance + cash_impact < 0:
         return jsonify({
-            "message": f"Sold {quantity_to_sell} shares of '{symbol}', remaining: {stock.quantity}",
-            "sale_proceeds": round(sale_proceeds, 2),
-            "current_price": current_price,
-            "profit_loss": round(profit_loss, 2),
-            "remaining_balance": round(account.balance, 2),
-            "remaining_shares": stock.quantity
-        }), 200
+            "error": f"Insufficient funds. Net cost: ${-cash_impact:.2f}, Available: ${account.balance:.2f}",
+            "results": results
+        }), 400
+    if any("error" in r for r in results):
+        return jsonify({"error": "Some orders cannot be filled, nothing was executed", "results": results}), 400
+
+    def execute_orders():
+        # Settle the net cash once up front; the batch may buy before it sells
+        adjust_balance(account, cash_impact)
+        for result in results:
+            if result["side"] == "BUY":
+                info = infos[result["symbol"]]
+                name = info.get('longName', info.get('shortName', result["symbol"]))
+                _, transaction, _ = apply_buy(account, result["symbol"], result["quantity"], result["price"],
+                                              name, settle_cash=False)
+            else:
+                stock = Stock.query.filter_by(account_id=account.id, symbol=result["symbol"]).first()
+                if not stock:
+                    raise TradeError(f"Stock with symbol '{result['symbol']}' not found")
+                transaction, _, realized_pnl, _ = apply_sell(account, stock, result["quantity"], result["price"],
+                                                             settle_cash=False)
+                result["realized_pnl"] = round(realized_pnl, 2)
+            result["transaction_id"] = transaction.id
+
+    try:
+        run_with_retry(execute_orders)
+    except TradeError as e:
+        return jsonify({"error": f"{str(e)}, nothing was executed", "results": results}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Batch failed, nothing was executed: {str(e)}"}), 500
+    db_seconds = time.perf_counter() - db_started
+
+    for result in results:
+        stream_hubs.publish(account.id, 'trade', {k: result[k] for k in ("symbol", "side", "quantity", "price")})
+
+    return jsonify({
+        "results": results,
+        "net_cash_impact": round(cash_impact, 2),
+        "remaining_balance": round(account.balance, 2),
+        "timing_ms": {
+            "price_fetch": round(price_fetch_seconds * 1000, 2),
+            "db": round(db_seconds * 1000, 2),
+            "total": round((time.perf_counter() - started) * 1000, 2)
+        }
+    }), 201
 
 @app.route('/api/stocks/update', methods=['POST'])
 def update_portfolio_table():
-    stocks = [s.symbol for s in Transactions.query.all()]
-    for s in stocks:
-        if s not in ALL_TIME_STOCKS:
-            update_stock_closing_prices(s)
-    return jsonify({"status": "done"}), 200
+    """Queue a background download of the closes traded symbols are missing; returns right away"""
+    if not stale_symbols():
+        return jsonify({"job_id": None, "status": "done"}), 200
+
+    job, _ = job_runner.submit('price_refresh')
+    return jsonify({"job_id": job.id, "status": job.status}), 202
+
+@app.route('/api/jobs/<int:job_id>')
+def get_job(job_id):
+    """Status of a background job"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_background_job(job_id):
+    """Cancel a queued or running job; a running one stops at its next progress update"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not cancel_job(job):
+        return jsonify({"error": f"Job already {job.status}"}), 409
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/backtest', methods=['POST'])
+def start_backtest():
+    """
+    Queue a what-if simulation against the stored closes and return its job id right away;
+    poll /api/jobs/<id> for progress and the result, POST /api/jobs/<id>/cancel to stop it.
+    Body: either "weights" ({symbol: weight}, rebalanced every "rebalance_days" trading days,
+    0 = buy and hold) or "trades" ([{date, symbol, type, quantity, price?}]), plus optional
+    start, end, cost_bps and starting_cash. "scenarios" (a list of overrides) or "grid"
+    ({field: [values]}) turns it into a sweep.
+    """
+    try:
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        start, end, scenarios = parse_request(request.get_json(silent=True), DEFAULT_STARTING_BALANCE, today)
+    except BacktestError as e:
+        return jsonify({"error": str(e)}), 400
 
-def strip_time(datetime_str):
-    return datetime_str.split(" ")[0]
+    try:
+        symbols = scenario_symbols(scenarios)
+        stored = {symbol for (symbol,) in
+                  db.session.query(Portfolio.symbol).filter(Portfolio.symbol.in_(symbols)).distinct()}
+        missing = [s for s in symbols if s not in stored]
+        if missing:
+            return jsonify({"error": f"No stored closes for {', '.join(missing[:10])}; run /api/stocks/update first"}), 400
+
+        job, _ = backtest_runner.submit('backtest', {"start": start, "end": end, "scenarios": scenarios}, single=False)
+        return jsonify({"job_id": job.id, "status": job.status, "scenarios": len(scenarios)}), 202
+    except Exception as e:
+        return jsonify({"error": f"Failed to start backtest: {str(e)}"}), 500
 
 @app.route('/api/portfolio/value', methods=['GET'])
 def get_portfolio_performance():
+    """Daily total portfolio value (cash + holdings marked at that day's close)"""
+    if not current_account():
+        return account_not_found()
     try:
-        # query the transaction table
-        transactions = Transactions.query.order_by(Transactions.date).all()
-
-        # get all dates as strings ans strip timestamp
-        all_dates = sorted(set(strip_time(str(t.date)) for t in transactions))
+        # The series runs through today, so a new day changes it without any write
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        return versioned_response(
+            lambda: json_array_chunks(portfolio_value_series(g.account_id), lambda row: row), scope=today
+        )
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch portfolio data: {str(e)}"}), 500
+   
+def chart_params():
+    """range, max_points and resolution query params of the chart endpoints; ValueError when invalid"""
+    range_ = request.args.get('range', DEFAULT_RANGE)
+    if range_ not in RANGES:
+        raise ValueError(range_)
+    max_points = int(request.args.get('max_points', DEFAULT_MAX_POINTS))
+    if not 2 <= max_points <= MAX_POINTS_LIMIT:
+        raise ValueError(max_points)
+    resolution = request.args.get('resolution')
+    if resolution and resolution not in RESOLUTION_NAMES:
+        raise ValueError(resolution)
+    return range_, max_points, resolution
+
+@app.route('/api/portfolio/value/chart', methods=['GET'])
+def get_portfolio_value_chart():
+    """
+    Daily total portfolio value over a range (default 1y) as parallel dates/values arrays,
+    thinned with LTTB to at most max_points points (default 500)
+    """
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    try:
+        range_, max_points, _ = chart_params()
+    except ValueError:
+        return jsonify({"error": f"Invalid range or max_points (2-{MAX_POINTS_LIMIT})"}), 400
+    if not current_account():
+        return account_not_found()
+
+    def build():
+        first = range_start(range_, today)
+        series = [row for row in portfolio_value_series(g.account_id) if first is None or row['date'] > first]
+        chart = line([row['date'] for row in series], [row['total_value'] for row in series], max_points, digits=2)
+        return [dumps({"range": range_, **chart})]
 
-        # Group transactions by date for faster access
-        transactions_by_date = defaultdict(list)
-        for t in transactions:
-            transactions_by_date[strip_time(str(t.date))].append(t)
-        
-        # get all stocks ever owned from the transactions table
-        stock_quantity_by_symbol = defaultdict(int)
-
-        # query the portfolio table
-        portfolio = Portfolio.query.all()
-        closing_prices_by_date = defaultdict(list)
-
-        # organize all closing prices for stocks by date
-        for p in portfolio:
-            closing_prices_by_date[p.date].append({
-                "symbol": p.symbol,
-                "closing_price": p.closing_price
-            })
+    try:
+        return versioned_response(build, scope=today)
+    except Exception as e:
+        return jsonify({"error": f"Failed to fetch portfolio data: {str(e)}"}), 500
 
-        portfolio_by_date = defaultdict(list)
-        
-        for d in all_dates:
-            # make a copy of the prev day
-            if portfolio_by_date:
-                last_date = max(portfolio_by_date.keys())
-                previous_day = portfolio_by_date[last_date]
-                portfolio_by_date[d] = deepcopy(previous_day)
-            # start with empty if the first day
-            else:
-                portfolio_by_date[d].append({
-                    "Account Balance" : 100000
-                })
-            
-            symbol_to_entry = [data["symbol"] for data in portfolio_by_date[d][1:]]
-
-            for t in transactions_by_date[d]:
-                # update quantity of stock
-                if t.type == "BUY":
-                    stock_quantity_by_symbol[t.symbol] += t.quantity
-                    portfolio_by_date[d][0]["Account Balance"] -= t.quantity * t.purchase_price
-                elif t.type == "SELL":
-                    stock_quantity_by_symbol[t.symbol] -= t.quantity
-                    portfolio_by_date[d][0]["Account Balance"] += t.quantity * t.purchase_price
-
-                if t.symbol not in symbol_to_entry:
-                    closing_price = 0
-                    for cp in closing_prices_by_date[d]:
-                        if cp["symbol"] == t.symbol:
-                            closing_price = cp["closing_price"]
-
-                    portfolio_by_date[d].append({
-                        "symbol": t.symbol,
-                        "quantity": stock_quantity_by_symbol[t.symbol],
-                        "closing_price": closing_price
-                    })
-                    symbol_to_entry.append(t.symbol)
-                else:
-                    for stock_dict in portfolio_by_date[d][1:]:
-                        if stock_dict["symbol"] == t.symbol:
-                            stock_dict["quantity"] = stock_quantity_by_symbol[t.symbol]
-            
-            # Remove any stocks with 0 quantity
-            filtered_stocks = [
-                entry for entry in portfolio_by_date[d][1:]
-                if entry["quantity"] > 0
-            ]
-            filtered_stocks.insert(0, portfolio_by_date[d][0])
-            portfolio_by_date[d] = filtered_stocks
-            
-        # Calculate the total for each day
-        portfolio_value_by_day = defaultdict(float)
+@app.route('/api/stocks/<ticker>/chart')
+def get_stock_chart(ticker):
+    """
+    Price chart of a symbol sized for the client, as parallel arrays.
+    Query params: range (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max; default 1y), max_points (default 500),
+    type=candles (OHLCV bars at the finest resolution that fits, or resolution=1d|1wk|1mo|3mo|1y)
+    or type=line (closes thinned with LTTB).
+    Cached per (symbol, range, resolution) until closes of the symbol are stored or CHART_CACHE_TTL passes.
+    """
+    symbol = ticker.upper()
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    kind = request.args.get('type', 'candles')
+    try:
+        range_, max_points, resolution = chart_params()
+        if kind not in ('candles', 'line'):
+            raise ValueError(kind)
+    except ValueError:
+        return jsonify({"error": f"Invalid range, max_points (2-{MAX_POINTS_LIMIT}), resolution or type"}), 400
 
-        for d in portfolio_by_date:
-            sum = portfolio_by_date[d][0]["Account Balance"]
-            for stock in portfolio_by_date[d][1:]:
-                sum += stock["quantity"] * stock["closing_price"]
-            portfolio_value_by_day[d] = sum
+    try:
+        # A new stored close for the symbol means a new bar upstream; the TTL catches today's bar moving
+        version = f"{symbol_version(symbol)}.{int(time.time() // app.config['CHART_CACHE_TTL'])}"
+        etag = make_etag(f"chart:{symbol}:{range_}:{kind}:{max_points}:{resolution}:{version}")
+        response = not_modified(etag)
+        if response is not None:
+            return response
+
+        bars = chart_bars_cache.get_or_build((symbol, range_), version,
+                                             lambda: market_data.history(symbol, period=range_))
+        if bars.empty:
+            return jsonify({'error': 'No data found for this ticker'}), 404
+
+        if kind == 'line':
+            key = (symbol, range_, 'line', max_points)
+            build = lambda: line(bars.index.strftime('%Y-%m-%d').tolist(), bars['Close'], max_points)
+        else:
+            span = range_days(range_, today)
+            if span is None:
+                span = (bars.index[-1] - bars.index[0]).days
+            resolution = coarsest(resolution, SOURCE_RESOLUTION) if resolution else choose_resolution(span, max_points)
+            key = (symbol, range_, resolution)
+            build = lambda: candles(resample_ohlc(bars, resolution), resolution)
+
+        body = chart_cache.get_or_build(
+            key, version, lambda: dumps({"symbol": symbol, "range": range_, "type": kind, **build()})
+        )
+        return json_stream([body], etag=etag)
+    except Exception as e:
+        return jsonify({"error": f"Failed to build chart: {str(e)}"}), 500
 
-        res = [
-        {"date": date, "total_value": round(value, 2)}
-        for date, value in sorted(portfolio_value_by_day.items())
-        ]
+@app.route('/api/portfolio/risk', methods=['GET'])
+def get_portfolio_risk():
+    """
+    Risk analytics: daily and cumulative returns, annualized volatility, Sharpe ratio, max drawdown,
+    one-day VaR, per-position volatility and beta against a benchmark, and the correlation matrix.
+    Optional query params: as_of (YYYY-MM-DD, default today), benchmark, confidence (default 0.95),
+    risk_free (annual rate, default 0)
+    """
+    try:
+        as_of = request.args.get('as_of') or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        datetime.strptime(as_of, '%Y-%m-%d')
+        benchmark = request.args.get('benchmark', app.config['RISK_BENCHMARK']).upper()
+        confidence = float(request.args.get('confidence', 0.95))
+        risk_free = float(request.args.get('risk_free', 0.0))
+        if not 0 < confidence < 1:
+            return jsonify({"error": "confidence must be between 0 and 1"}), 400
+    except ValueError:
+        return jsonify({"error": "Invalid as_of, confidence or risk_free"}), 400
 
-        return jsonify(res), 200
+    try:
+        if not current_account():
+            return account_not_found()
+        return jsonify(portfolio_risk(g.account_id, as_of, benchmark, confidence, risk_free)), 200
     except Exception as e:
-        return jsonify({"error": f"Failed to fetch portfolio data: {str(e)}"}), 500
-   
+        return jsonify({"error": f"Failed to calculate portfolio risk: {str(e)}"}), 500
+
+TRANSACTIONS_DEFAULT_LIMIT = 50
+TRANSACTIONS_MAX_LIMIT = 500
+
+def encode_cursor(transaction):
+    """Opaque keyset cursor pointing just past a transaction in (date, id) order"""
+    raw = f"{transaction.date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    date_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(date_str), int(id_str)
+
 @app.route('/api/transactions', methods=['GET'])
 def get_transaction_history():
-    """Get all transaction history ordered by date (newest first)"""
+    """
+    Transaction history, newest first, one page at a time.
+    Query params: limit, cursor (next_cursor from the previous page), symbol, type (BUY/SELL),
+    start and end (YYYY-MM-DD, inclusive).
+    """
     try:
-        transactions = Transactions.query.order_by(Transactions.date.desc(), Transactions.id.desc()).all()
-        
-        transaction_list = []
-        for transaction in transactions:
-            # Calculate total cost/proceeds for each transaction
-            total_amount = transaction.quantity * transaction.purchase_price
-            
-            transaction_data = transaction.to_dict()
-            transaction_data['total_amount'] = round(total_amount, 2)
-            transaction_list.append(transaction_data)
-        
-        return jsonify(transaction_list), 200
+        limit = min(int(request.args.get('limit', TRANSACTIONS_DEFAULT_LIMIT)), TRANSACTIONS_MAX_LIMIT)
+        if limit <= 0:
+            return jsonify({"error": "Limit must be greater than 0"}), 400
+
+        query = select(
+            Transactions.id, Transactions.symbol, Transactions.date, Transactions.type,
+            Transactions.quantity, Transactions.purchase_price, Transactions.total_amount
+        ).where(Transactions.account_id == g.account_id)
+        if request.args.get('symbol'):
+            query = query.where(Transactions.symbol == request.args['symbol'].upper())
+        if request.args.get('type'):
+            query = query.where(Transactions.type == request.args['type'].upper())
+        if request.args.get('start'):
+            query = query.where(Transactions.date >= datetime.strptime(request.args['start'], '%Y-%m-%d'))
+        if request.args.get('end'):
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1)
+            query = query.where(Transactions.date < end)
+        if request.args.get('cursor'):
+            cursor_date, cursor_id = decode_cursor(request.args['cursor'])
+            query = query.where(or_(
+                Transactions.date < cursor_date,
+                and_(Transactions.date == cursor_date, Transactions.id < cursor_id)
+            ))
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({"error": "Invalid limit, cursor or date filter"}), 400
+
+    try:
+        def build():
+            # Fetch one extra row to know whether another page exists
+            rows = db.session.execute(
+                query.order_by(Transactions.date.desc(), Transactions.id.desc()).limit(limit + 1)
+            ).all()
+            page = rows[:limit]
+            next_cursor = encode_cursor(page[-1]) if len(rows) > limit else None
+
+            yield b'{"transactions":'
+            yield from json_array_chunks(page, lambda r: {
+                "id": r[0], "symbol": r[1], "date": r[2], "type": r[3], "quantity": r[4],
+                "purchase_price": r[5], "total_amount": round(r[6], 2)
+            })
+            yield b',"next_cursor":' + dumps(next_cursor) + b'}'
+
+        return versioned_response(build)
     except Exception as e:
         return jsonify({"error": f"Failed to fetch transaction history: {str(e)}"}), 500
 
 @app.route('/api/portfolio/realized-pnl', methods=['GET'])
 def get_realized_pnl():
-    """Calculate total realized profit/loss from completed transactions"""
+    """
+    Total realized profit/loss from the FIFO lot ledger.
+    Optional query params: symbol, start and end (YYYY-MM-DD, inclusive), breakdown=symbol|date
+    """
     try:
-        # Get all transactions grouped by symbol
-        transactions = Transactions.query.order_by(Transactions.date.asc()).all()
-        
-        # Track position for each symbol (FIFO - First In, First Out)
-        positions = {}  # symbol: [(quantity, price), ...]
-        total_realized_pnl = 0.0
-        
-        for transaction in transactions:
-            symbol = transaction.symbol
-            
-            if symbol not in positions:
-                positions[symbol] = []
-            
-            if transaction.type == 'BUY':
-                # Add to position
-                positions[symbol].append({
-                    'quantity': transaction.quantity,
-                    'price': transaction.purchase_price
-                })
-            
-            elif transaction.type == 'SELL':
-                # Calculate realized P&L using FIFO
-                quantity_to_sell = transaction.quantity
-                sale_price = transaction.purchase_price  # This is current price at time of sale
-                
-                while quantity_to_sell > 0 and positions[symbol]:
-                    oldest_position = positions[symbol][0]
-                    
-                    if oldest_position['quantity'] <= quantity_to_sell:
-                        # Sell entire oldest position
-                        realized_pnl = (sale_price - oldest_position['price']) * oldest_position['quantity']
-                        total_realized_pnl += realized_pnl
-                        quantity_to_sell -= oldest_position['quantity']
-                        positions[symbol].pop(0)  # Remove sold position
-                    else:
-                        # Partial sale of oldest position
-                        realized_pnl = (sale_price - oldest_position['price']) * quantity_to_sell
-                        total_realized_pnl += realized_pnl
-                        oldest_position['quantity'] -= quantity_to_sell
-                        quantity_to_sell = 0
-        
-        return jsonify({
-            "total_realized_pnl": round(total_realized_pnl, 2)
-        }), 200
-        
+        symbol = request.args.get('symbol', '').upper() or None
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else None
+        breakdown = request.args.get('breakdown')
+        if breakdown not in (None, 'symbol', 'date'):
+            return jsonify({"error": "breakdown must be 'symbol' or 'date'"}), 400
+    except ValueError:
+        return jsonify({"error": "Dates must be YYYY-MM-DD"}), 400
+
+    try:
+        return versioned_response(lambda: [dumps(realized_pnl_summary(g.account_id, symbol, start, end, group_by=breakdown))])
     except Exception as e:
         return jsonify({"error": f"Failed to calculate realized P&L: {str(e)}"}), 500
 
+@app.cli.command('rebuild-ledger')
+@click.option('--check', is_flag=True, help='Only compare the stored ledger with a full replay')
+def rebuild_ledger_command(check):
+    """Rebuild the FIFO tax-lot ledger from the transaction history"""
+    if not check:
+        lots, sales = rebuild_ledger()
+        db.session.commit()
+        click.echo(f"Rebuilt ledger: {lots} lots, {sales} lot sales")
+
+    mismatches = verify_ledger()
+    for m in mismatches:
+        click.echo(f"account {m['account_id']} {m['symbol']}: stored {m['stored']} != replay {m['expected']}")
+    click.echo("Ledger matches a full replay" if not mismatches else f"{len(mismatches)} symbols differ")
+    if mismatches:
+        raise SystemExit(1)
+
 if __name__ == '__main__':
     app.run(port=5050, debug=True)
@@ -0,0 +1,219 @@
+"""
+ASGI serving mode: the same Flask app and models, served so that slow market-data calls
+don't tie up the threads database work runs on.
+
+Every request first awaits the quotes its view is going to look up (QuoteCache.get_many_async:
+one in-flight fetch per symbol, at most QUOTE_MAX_CONCURRENT upstream at once). The Flask view
+then runs unchanged on a bounded pool of DB_THREADS threads and finds those quotes in the cache.
+Where the wait holds a thread depends on the provider:
+
+- SyntheticProvider awaits its latency, so a waiting request holds no thread.
+- yfinance only blocks, so each quote fetch holds one of the quote cache's QUOTE_MAX_CONCURRENT
+  fetch threads. Throughput with it is capped at QUOTE_MAX_CONCURRENT / latency, still independent
+  of DB_THREADS.
+- Views that load price history upstream (GET /api/stocks/<ticker> and its /chart) run on
+  their own pool of QUOTE_MAX_CONCURRENT threads for the same reason.
+- A sell whose quote has no price falls back to last_close() inside its view, on a DB thread.
+
+Event streams wait for their next message on a pool of their own.
+
+Run:  pip install uvicorn && uvicorn asgi:app --port 5050
+"""
+import asyncio
+import contextvars
+import io
+import json
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from app import app as flask_app, quote_cache
+from models import db, Stock, DEFAULT_ACCOUNT_ID
+
+# symbols_to_quote() result meaning "the account's current holdings"
+HOLDINGS = object()
+# GET views that call the market data provider's history() themselves
+HISTORY_VIEWS = re.compile(r'^/api/stocks/[^/]+(/chart)?$')
+
+
+def _json(body):
+    try:
+        data = json.loads(body) if body else {}
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def symbols_to_quote(method, path, query, body):
+    """Symbols the Flask view for this request will look up in the quote cache, or HOLDINGS"""
+    if method == 'GET' and path.startswith('/api/search/'):
+        return [path[len('/api/search/'):]]
+    if method == 'GET' and path == '/api/quotes':
+        symbols = query.get('symbols', [''])[0]
+        return [s.strip() for s in symbols.split(',') if s.strip()] or HOLDINGS
+
+    data = _json(body)
+    if method == 'POST' and path == '/api/stocks' and data.get('symbol') and not data.get('purchase_price'):
+        return [str(data['symbol'])]
+    if method == 'DELETE' and path == '/api/stocks/delete_by_symbol' and data.get('symbol'):
+        return [str(data['symbol'])]
+    if method == 'POST' and path == '/api/orders/batch' and isinstance(data.get('orders'), list):
+        return [str(o['symbol']) for o in data['orders'] if isinstance(o, dict) and o.get('symbol')]
+    return []
+
+
+def holding_symbols(account_id):
+    with flask_app.app_context():
+        return [symbol for (symbol,) in db.session.query(Stock.symbol).filter(Stock.account_id == account_id)]
+
+
+def build_environ(scope, body):
+    """WSGI environ (PEP 3333) for an ASGI HTTP request whose body has been read"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _close(iterable):
+    if hasattr(iterable, 'close'):
+        iterable.close()
+
+
+class AsyncApp:
+    """ASGI callable in front of a Flask (WSGI) app; see the module docstring"""
+
+    def __init__(self, wsgi_app, db_threads=8, stream_threads=64, upstream_threads=32):
+        self.wsgi_app = wsgi_app
+        self.db_pool = ThreadPoolExecutor(max_workers=db_threads, thread_name_prefix='asgi-db')
+        self.stream_pool = ThreadPoolExecutor(max_workers=stream_threads, thread_name_prefix='asgi-stream')
+        self.upstream_pool = ThreadPoolExecutor(max_workers=upstream_threads, thread_name_prefix='asgi-upstream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        body = await self._read_body(receive)
+        try:
+            await self._prefetch_quotes(scope, body)
+        except Exception:
+            pass  # the view fetches (and reports on) anything that is still missing
+        await self._respond(scope, body, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in (self.db_pool, self.stream_pool, self.upstream_pool):
+                    pool.shutdown(wait=False, cancel_futures=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def run_db(self, fn, *args):
+        """Run blocking (database) work on the bounded pool"""
+        return await asyncio.get_running_loop().run_in_executor(self.db_pool, fn, *args)
+
+    async def _prefetch_quotes(self, scope, body):
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        symbols = symbols_to_quote(scope['method'], scope['path'], query, body)
+        if symbols is HOLDINGS:
+            headers = dict(scope.get('headers', []))
+            raw = query.get('account_id', [None])[0] or headers.get(b'x-account-id', b'').decode('latin-1')
+            account_id = int(raw) if raw else DEFAULT_ACCOUNT_ID
+            symbols = await self.run_db(holding_symbols, account_id)
+        if symbols:
+            await quote_cache.get_many_async(symbols)
+
+    def _start(self, environ):
+        """Call the WSGI app; the whole body unless it is an event stream, whose iterator is returned"""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+        iterable = self.wsgi_app(environ, start_response)
+        streaming = any(k == b'content-type' and v.startswith(b'text/event-stream') for k, v in started['headers'])
+        if streaming:
+            return started['status'], started['headers'], None, iterable
+        try:
+            body = b''.join(iterable)
+        finally:
+            _close(iterable)
+        return started['status'], started['headers'], body, None
+
+    async def _respond(self, scope, body, receive, send):
+        loop = asyncio.get_running_loop()
+        # Flask keeps its contexts in context variables, so every step of one response runs in one Context
+        context = contextvars.copy_context()
+        upstream = scope['method'] == 'GET' and HISTORY_VIEWS.match(scope['path'])
+        status, headers, content, iterable = await loop.run_in_executor(
+            self.upstream_pool if upstream else self.db_pool, context.run, self._start, build_environ(scope, body)
+        )
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if iterable is None:
+            await send({'type': 'http.response.body', 'body': content})
+            return
+
+        # Event stream: each wait for the next message happens on the stream pool, until the client leaves
+        disconnected = asyncio.ensure_future(self._read_until_disconnect(receive))
+        iterator = iter(iterable)
+        try:
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(self.stream_pool, context.run, next, iterator, None)
+                if chunk is None:
+                    break
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await loop.run_in_executor(self.stream_pool, context.run, _close, iterable)
+
+    async def _read_until_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+app = AsyncApp(flask_app.wsgi_app, db_threads=flask_app.config['DB_THREADS'],
+               stream_threads=flask_app.config['STREAM_THREADS'],
+               upstream_threads=flask_app.config['QUOTE_MAX_CONCURRENT'])
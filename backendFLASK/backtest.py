@@ -0,0 +1,431 @@
+"""
+What-if simulations against the stored closes: target-weight strategies rebalanced every
+n trading days, or lists of hypothetical trades. Each run is array arithmetic over a
+dates x symbols close matrix; target-weight scenarios that share a rebalance period are
+evaluated together as one matrix product. Sweeps are split into chunks that run on a
+process pool, so a long sweep never occupies an API worker.
+"""
+import atexit
+import itertools
+import math
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import numpy as np
+
+TRADING_DAYS = 252
+DEFAULT_REBALANCE_DAYS = 21
+MAX_SCENARIOS = 10000
+# Sweeps larger than this only return the equity curve of their best scenario
+MAX_CURVES = 20
+# Cells of the drift array simulated at once; bounds memory for daily rebalancing
+BLOCK_CELLS = 4_000_000
+MONEY_FIELDS = ('final_value', 'pnl', 'traded_value', 'costs')
+SCENARIO_FIELDS = ('label', 'weights', 'trades', 'rebalance_days', 'cost_bps', 'starting_cash')
+
+
+def _pool_context():
+    """
+    Start method for the sweep pool. The pool is created from a job thread of a multithreaded
+    server, where fork can copy a lock another thread holds (SQLAlchemy pool, logging, BLAS)
+    into a child that then deadlocks, so workers come from a forkserver (spawn where there is none).
+    The forkserver only preloads this module.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class BacktestError(ValueError):
+    """Invalid backtest request; the message is safe to show to the client"""
+
+
+def _date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise BacktestError(f"{field} must be YYYY-MM-DD")
+
+
+def _number(value, field, minimum=0.0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value) or value < minimum:
+        raise BacktestError(f"{field} must be a number >= {minimum:g}")
+    return float(value)
+
+
+def _scenario(raw, index, default_cash):
+    """Validate one scenario into plain types the workers can use"""
+    where = f"scenario {index}"
+    scenario = {
+        "label": raw.get('label'),
+        "cost_bps": _number(raw.get('cost_bps', 0.0), f"{where}: cost_bps"),
+        "starting_cash": _number(raw.get('starting_cash', default_cash), f"{where}: starting_cash"),
+    }
+    if ('weights' in raw) == ('trades' in raw):
+        raise BacktestError(f"{where}: give either weights or trades")
+
+    if 'weights' in raw:
+        weights = raw['weights']
+        if not isinstance(weights, dict) or not weights:
+            raise BacktestError(f"{where}: weights must be an object of symbol: weight")
+        weights = {str(s).upper(): _number(w, f"{where}: weight of {s}") for s, w in weights.items()}
+        if sum(weights.values()) > 1 + 1e-9:
+            raise BacktestError(f"{where}: weights add up to more than 1")
+        rebalance = raw.get('rebalance_days', DEFAULT_REBALANCE_DAYS)
+        if isinstance(rebalance, bool) or not isinstance(rebalance, int) or rebalance < 0:
+            raise BacktestError(f"{where}: rebalance_days must be an integer >= 0 (0 = buy and hold)")
+        scenario.update(weights=weights, rebalance_days=rebalance)
+    else:
+        trades = raw['trades']
+        if not isinstance(trades, list) or not trades:
+            raise BacktestError(f"{where}: trades must be a non-empty list")
+        parsed = []
+        for t in trades:
+            if not isinstance(t, dict) or not t.get('symbol') or str(t.get('type', 'BUY')).upper() not in ('BUY', 'SELL'):
+                raise BacktestError(f"{where}: each trade needs date, symbol, quantity and type BUY/SELL")
+            quantity = _number(t.get('quantity'), f"{where}: trade quantity")
+            price = t.get('price')
+            parsed.append({
+                "date": _date(t.get('date'), f"{where}: trade date"),
+                "symbol": str(t['symbol']).upper(),
+                "quantity": quantity if str(t.get('type', 'BUY')).upper() == 'BUY' else -quantity,
+                "price": _number(price, f"{where}: trade price") if price is not None else None
+            })
+        scenario.update(trades=parsed)
+    return scenario
+
+
+def parse_request(body, default_cash, today):
+    """
+    Validate a /api/backtest body into (start, end, scenarios).
+    The top-level fields describe one scenario; "scenarios" (a list of overrides) or "grid"
+    (field: [values], every combination) turn it into a sweep.
+    """
+    if not isinstance(body, dict):
+        raise BacktestError("Request body must be a JSON object")
+    start = _date(body['start'], 'start') if body.get('start') else None
+    end = _date(body['end'], 'end') if body.get('end') else today
+    if start and start > end:
+        raise BacktestError("start is after end")
+
+    base = {k: body[k] for k in SCENARIO_FIELDS if k in body}
+    if 'scenarios' in body and 'grid' in body:
+        raise BacktestError("Give scenarios or grid, not both")
+    if 'scenarios' in body:
+        if not isinstance(body['scenarios'], list) or not body['scenarios'] \
+                or not all(isinstance(s, dict) for s in body['scenarios']):
+            raise BacktestError("scenarios must be a non-empty list of objects")
+        overrides = body['scenarios']
+    elif 'grid' in body:
+        grid = body['grid']
+        if not isinstance(grid, dict) or not grid or set(grid) - set(SCENARIO_FIELDS) \
+                or not all(isinstance(v, list) and v for v in grid.values()):
+            raise BacktestError(f"grid must map some of {', '.join(SCENARIO_FIELDS)} to non-empty lists")
+        size = math.prod(len(v) for v in grid.values())
+        if size > MAX_SCENARIOS:
+            raise BacktestError(f"At most {MAX_SCENARIOS} scenarios per backtest")
+        overrides = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    else:
+        overrides = [{}]
+
+    if len(overrides) > MAX_SCENARIOS:
+        raise BacktestError(f"At most {MAX_SCENARIOS} scenarios per backtest")
+    scenarios = [_scenario({**base, **o}, i, default_cash) for i, o in enumerate(overrides)]
+    return start, end, scenarios
+
+
+def scenario_symbols(scenarios):
+    symbols = set()
+    for s in scenarios:
+        symbols.update(s['weights'] if 'weights' in s else (t['symbol'] for t in s['trades']))
+    return sorted(symbols)
+
+
+def close_frame(close_matrix, symbols, start, end):
+    """
+    Closes for the simulation window from the shared in-memory close matrix, carried forward
+    over missing days. The window starts on the first day every symbol has a close.
+    """
+    frame = close_matrix.get(symbols, end=end).ffill()
+    if start:
+        frame = frame.loc[start:]
+    missing = [s for s in symbols if frame[s].isna().all()] if len(frame) else symbols
+    if missing:
+        raise BacktestError(f"No stored closes for {', '.join(missing[:10])} in the window; "
+                            "run /api/stocks/update or pick another start")
+    frame = frame.dropna()
+    if len(frame) < 2:
+        raise BacktestError("Need at least two days of closes in the window")
+    return frame
+
+
+def _max_drawdown(equity):
+    """Largest peak-to-trough fall of every column of a days x scenarios equity array"""
+    peaks = np.maximum.accumulate(equity, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        drawdowns = np.where(peaks > 0, equity / peaks - 1.0, 0.0)
+    return drawdowns.min(axis=0)
+
+
+def _metrics(equity, starting_cash, traded, costs):
+    """Summary numbers for each column of a days x scenarios equity array"""
+    days = equity.shape[0] - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = equity[1:] / equity[:-1] - 1.0
+        total_return = equity[-1] / starting_cash - 1.0
+        annualized = (1.0 + total_return) ** (TRADING_DAYS / days) - 1.0
+        turnover = traded / equity.mean(axis=0)
+    volatility = daily.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS) if days > 1 else np.full(equity.shape[1], np.nan)
+    return {
+        "final_value": equity[-1],
+        "pnl": equity[-1] - starting_cash,
+        "total_return": total_return,
+        "annualized_return": annualized,
+        "annualized_volatility": volatility,
+        "max_drawdown": _max_drawdown(equity),
+        "traded_value": traded,
+        "turnover": turnover,
+        "annualized_turnover": turnover * TRADING_DAYS / days,
+        "costs": costs
+    }
+
+
+def simulate_weights(prices, weights, rebalance_days, cost_bps, starting_cash):
+    """
+    Target-weight portfolios over a days x symbols close array, one column per scenario
+    (weights is scenarios x symbols, the rest per scenario). Every portfolio buys its weights
+    on the first close and trades back to them every rebalance_days closes (0 = never), paying
+    cost_bps on the value traded. Between rebalances each holding moves with its own price, so
+    the whole curve is a matrix product of price relatives per rebalance period.
+    Returns (equity days x scenarios, traded value, costs).
+    """
+    n_days = prices.shape[0]
+    period = rebalance_days or n_days
+    cost = np.asarray(cost_bps, dtype=float) / 10000.0
+    cash_weight = 1.0 - weights.sum(axis=1)
+
+    # Day t (t >= 1) belongs to the period that began at the close of anchor[t]
+    t = np.arange(1, n_days)
+    segment = (t - 1) // period
+    anchor = segment * period
+    growth = (prices[t] / prices[anchor]) @ weights.T + cash_weight  # days-1 x scenarios
+
+    # Growth over each whole period and the weights it drifted to by its last day
+    n_segments = segment[-1] + 1
+    ends = np.minimum((np.arange(n_segments) + 1) * period, n_days - 1)
+    end_growth = growth[ends - 1]  # segments x scenarios
+    end_relatives = prices[ends] / prices[np.arange(n_segments) * period]  # segments x symbols
+
+    # Turnover as a fraction of equity: the initial buy, then each rebalance back to target.
+    # A holding drifts to w * r / g by the period's end, so trading it back is w * |g - r| / g
+    drift = np.abs(end_growth[:-1, :, None] - end_relatives[:-1, None, :])  # segments-1 x scenarios x symbols
+    rebalance_turnover = np.einsum('psn,sn->ps', drift, weights) / end_growth[:-1]
+    turnover = np.vstack([weights.sum(axis=1)[None], rebalance_turnover])
+    keep = 1.0 - cost * turnover  # share of equity left after each trade's costs
+
+    # Equity right after the trades at the start of each period
+    start_equity = starting_cash * np.cumprod(np.vstack([keep[:1], end_growth[:-1] * keep[1:]]), axis=0)
+    equity = np.empty((n_days, weights.shape[0]))
+    equity[0] = start_equity[0]
+    equity[1:] = start_equity[segment] * growth
+    rebalanced = ends[:-1]
+    equity[rebalanced] *= keep[1:]
+
+    before_trade = np.vstack([np.full((1, weights.shape[0]), starting_cash), start_equity[:-1] * end_growth[:-1]])
+    traded = (turnover * before_trade).sum(axis=0)
+    costs = (cost * turnover * before_trade).sum(axis=0)
+    return equity, traded, costs
+
+
+def simulate_trades(prices, dates, symbols, trades, cost_bps, starting_cash):
+    """
+    A list of hypothetical trades over a days x symbols close array. A trade fills on its date
+    (or the next day with a close) at its price, or that day's close when it has none.
+    Returns (equity per day, traded value, costs).
+    """
+    column = {s: i for i, s in enumerate(symbols)}
+    days = np.searchsorted(dates, [t['date'] for t in trades])
+    if any(t['date'] < dates[0] for t in trades) or (days >= len(dates)).any():
+        raise BacktestError(f"Trades must fall between {dates[0]} and {dates[-1]}")
+    cols = np.array([column[t['symbol']] for t in trades])
+    quantity = np.array([t['quantity'] for t in trades], dtype=float)
+    fill = np.array([t['price'] if t['price'] is not None else np.nan for t in trades], dtype=float)
+    fill = np.where(np.isnan(fill), prices[days, cols], fill)
+
+    traded_value = np.abs(quantity * fill)
+    fees = traded_value * cost_bps / 10000.0
+    shares = np.zeros_like(prices)
+    np.add.at(shares, (days, cols), quantity)
+    cash_flow = np.zeros(len(dates))
+    np.add.at(cash_flow, days, -quantity * fill - fees)
+
+    equity = starting_cash + np.cumsum(cash_flow) + (np.cumsum(shares, axis=0) * prices).sum(axis=1)
+    return equity, traded_value.sum(), fees.sum()
+
+
+def _round(values, digits):
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), np.round(values, digits), None).tolist()
+
+
+def _results(group, equity, traded, costs, curves):
+    """Result dicts for a group of scenarios simulated together (equity is days x scenarios)"""
+    cash = np.array([s['starting_cash'] for s in group])
+    metrics = {k: _round(v, 2 if k in MONEY_FIELDS else 6) for k, v in _metrics(equity, cash, traded, costs).items()}
+    out = []
+    for row, s in enumerate(group):
+        result = {
+            "scenario": s['index'],
+            "label": s['label'],
+            "rebalance_days": s.get('rebalance_days'),
+            "cost_bps": s['cost_bps'],
+            "starting_cash": s['starting_cash'],
+            **{k: v[row] for k, v in metrics.items()}
+        }
+        if curves:
+            result["equity_curve"] = _round(equity[:, row], 2)
+        out.append(result)
+    return out
+
+
+def run_scenarios(prices, dates, symbols, scenarios, curves):
+    """
+    Simulate a batch of scenarios (dicts from parse_request, each with its sweep index) and
+    return one result per scenario: summary metrics, plus the equity curve when curves is set.
+    """
+    column = {s: i for i, s in enumerate(symbols)}
+    out = []
+
+    by_period = {}
+    for s in scenarios:
+        if 'weights' in s:
+            by_period.setdefault(s['rebalance_days'], []).append(s)
+        else:
+            equity, traded, costs = simulate_trades(prices, dates, symbols, s['trades'], s['cost_bps'], s['starting_cash'])
+            out.extend(_results([s], equity[:, None], np.array([traded]), np.array([costs]), curves))
+
+    for period, group in by_period.items():
+        # simulate_weights holds a periods x scenarios x symbols drift array; keep that bounded
+        n_periods = math.ceil((len(dates) - 1) / period) if period else 1
+        block = max(1, BLOCK_CELLS // (n_periods * len(symbols)))
+        for i in range(0, len(group), block):
+            part = group[i:i + block]
+            weights = np.zeros((len(part), len(symbols)))
+            for row, s in enumerate(part):
+                for symbol, w in s['weights'].items():
+                    weights[row, column[symbol]] = w
+            cash = np.array([s['starting_cash'] for s in part])
+            equity, traded, costs = simulate_weights(prices, weights, period, [s['cost_bps'] for s in part], 1.0)
+            out.extend(_results(part, equity * cash, traded * cash, costs * cash, curves))
+    return out
+
+
+# One pool per process, started by the first sweep and kept for the next ones
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _pool_workers = workers
+        return _pool
+
+
+def _drop_pool(pool):
+    """Forget a pool whose workers died so the next sweep starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _run_chunk(prices_path, dates, symbols, scenarios, curves):
+    # The sweep's closes are memory-mapped, so every worker shares one copy in the page cache
+    prices = np.load(prices_path, mmap_mode='r')
+    return run_scenarios(prices, dates, symbols, scenarios, curves)
+
+
+def run_backtest(frame, scenarios, workers=1, progress=None):
+    """
+    Run every scenario against a dates x symbols close frame. Sweeps are split into chunks
+    run on a pool of `workers` processes; progress(done, total) is called after each chunk and
+    may raise to stop the sweep (chunks not started yet are cancelled).
+    Returns the result dict served by /api/backtest jobs.
+    """
+    prices = frame.to_numpy(dtype=float)
+    dates = np.array(frame.index, dtype=str)
+    symbols = list(frame.columns)
+    scenarios = [{**s, "index": i} for i, s in enumerate(scenarios)]
+    curves = len(scenarios) <= MAX_CURVES
+    total = len(scenarios)
+
+    # A few chunks per worker keeps them all busy and progress moving
+    size = max(1, math.ceil(total / (workers * 4))) if workers > 1 else total
+    chunks = [scenarios[i:i + size] for i in range(0, total, size)]
+    results = []
+    if workers > 1 and len(chunks) > 1:
+        pool = _get_pool(workers)
+        fd, prices_path = tempfile.mkstemp(suffix='.npy', prefix='backtest-')
+        pending = set()
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, prices)
+            pending = {pool.submit(_run_chunk, prices_path, dates, symbols, chunk, curves) for chunk in chunks}
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results.extend(future.result())
+                if progress:
+                    progress(len(results), total)
+        except BrokenProcessPool:
+            _drop_pool(pool)
+            raise
+        finally:
+            # Chunks not started yet are dropped; running ones finish before the file goes
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            os.remove(prices_path)
+    else:
+        for chunk in chunks:
+            results.extend(run_scenarios(prices, dates, symbols, chunk, curves))
+            if progress:
+                progress(len(results), total)
+
+    results.sort(key=lambda r: r['scenario'])
+    result = {
+        "start": dates[0],
+        "end": dates[-1],
+        "days": len(dates),
+        "symbols": symbols,
+        "dates": dates.tolist(),
+        "scenarios": results
+    }
+    if not curves:
+        # Replay the best scenario alone for its curve rather than shipping every curve back
+        best = max(results, key=lambda r: r['final_value'] if r['final_value'] is not None else -math.inf)
+        result["best"] = run_scenarios(prices, dates, symbols, [scenarios[best['scenario']]], True)[0]
+    return result
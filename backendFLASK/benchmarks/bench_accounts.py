@@ -0,0 +1,120 @@
+"""
+Per-account latency as the number of other accounts grows. One target account gets a fixed
+trade history; other accounts (each with its own random history over the same shared closes)
+are then added in stages, and after each stage the target account's endpoints are timed with
+the response cache empty:
+
+  value cold         /api/portfolio/value with no persisted snapshots (full recompute)
+  value incremental  /api/portfolio/value with snapshots up to yesterday
+  transactions       first /api/transactions page
+  realized P&L       /api/portfolio/realized-pnl?breakdown=symbol
+
+With every per-account query on an index that leads on account_id these stay flat; the run
+fails when the cold portfolio value at the last stage is more than --tolerance slower than
+with no other accounts.
+
+Run from backendFLASK/:  python benchmarks/bench_accounts.py --accounts 0,1000,10000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', default='0,1000,10000', help='total other accounts at each stage')
+    parser.add_argument('--trades', type=int, default=2000, help='transactions in the measured account')
+    parser.add_argument('--other-trades', type=int, default=20, help='transactions per other account')
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed slowdown at the last stage (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'accounts.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    os.environ['WARMUP_ON_START'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    from load_api import generate_trades, insert_account_history, insert_closes
+    from models import db, Account, DEFAULT_ACCOUNT_ID, DEFAULT_STARTING_BALANCE, PortfolioSnapshot, Transactions
+
+    stages = [int(n) for n in args.accounts.split(',')]
+    client = backend.app.test_client()
+
+    with backend.app.app_context():
+        closes = insert_closes(backend, args.symbols, args.years)
+        trades, cash, held = generate_trades(closes, args.trades, DEFAULT_STARTING_BALANCE, 0, DEFAULT_ACCOUNT_ID)
+        lots, _ = insert_account_history(DEFAULT_ACCOUNT_ID, trades, held)
+        db.session.get(Account, DEFAULT_ACCOUNT_ID).balance = cash
+        db.session.commit()
+    next_id, next_lot_id = len(trades) + 1, lots + 1
+    print(f"measured account: {len(trades)} transactions, {len(held)} holdings, {args.symbols} symbols")
+
+    def timed(path, reset=None):
+        samples = []
+        for _ in range(args.repeats):
+            if reset:
+                reset()
+            backend.response_cache.clear()
+            started = time.perf_counter()
+            response = client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+        return statistics.median(samples)
+
+    def drop_snapshots():
+        with backend.app.app_context():
+            PortfolioSnapshot.query.filter_by(account_id=DEFAULT_ACCOUNT_ID).delete()
+            db.session.commit()
+
+    results = []
+    others = 0
+    for target in stages:
+        started = time.perf_counter()
+        with backend.app.app_context():
+            while others < target:
+                account = Account(balance=DEFAULT_STARTING_BALANCE, starting_balance=DEFAULT_STARTING_BALANCE)
+                db.session.add(account)
+                db.session.flush()
+                trades, cash, held = generate_trades(closes, args.other_trades, DEFAULT_STARTING_BALANCE,
+                                                     account.id, account.id, first_id=next_id)
+                lots, _ = insert_account_history(account.id, trades, held, first_lot_id=next_lot_id)
+                account.balance = cash
+                next_id += len(trades)
+                next_lot_id += lots
+                others += 1
+                if others % 1000 == 0:
+                    db.session.commit()
+            db.session.commit()
+            total = db.session.query(Transactions).count()
+        seeded = time.perf_counter() - started
+
+        row = {
+            "accounts": others,
+            "transactions": total,
+            "value_cold": timed('/api/portfolio/value', reset=drop_snapshots),
+            "value_incremental": timed('/api/portfolio/value'),
+            "transactions_page": timed('/api/transactions?limit=50'),
+            "realized_pnl": timed('/api/portfolio/realized-pnl?breakdown=symbol'),
+        }
+        results.append(row)
+        print(f"{others:>6} other accounts, {total:>8} transactions (seeded in {seeded:5.1f} s): "
+              f"value cold {row['value_cold']:7.1f} ms, incremental {row['value_incremental']:6.1f} ms, "
+              f"transactions {row['transactions_page']:5.1f} ms, realized P&L {row['realized_pnl']:5.1f} ms")
+
+    slowdown = results[-1]['value_cold'] / results[0]['value_cold'] - 1
+    print(f"cold portfolio value at {results[-1]['accounts']} other accounts vs {results[0]['accounts']}: {slowdown:+.0%}")
+    if slowdown > args.tolerance:
+        print(f"FAIL: more than {args.tolerance:.0%} slower")
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Throughput with a slow market-data upstream. Every upstream call takes --latency seconds
+(SYNTHETIC_LATENCY) and every request asks for a symbol nobody asked for before, so each one
+goes upstream. The threaded WSGI app is driven by --threads worker threads, which caps it at
+threads / latency requests a second however many clients wait. The ASGI app (asgi.py) is
+driven in process by --clients concurrent clients with DB_THREADS = --threads, twice:
+
+- awaiting: the synthetic provider's info_async, which waits without a thread
+- blocking: the quote cache calls the blocking info() on its QUOTE_MAX_CONCURRENT fetch
+  threads, as it does with yfinance; it scales too, but holds a thread per call in flight
+
+Stock detail requests (history() inside the view, blocking for every provider) run on the
+ASGI app's upstream pool. The threads column is the process's thread count after each run.
+Also sends many concurrent lookups of one symbol to check they share a single upstream call.
+Fails if the ASGI app doesn't scale past the thread cap.
+
+Run from backendFLASK/:  python benchmarks/bench_async.py --latency 0.2 --threads 8 --clients 8,32,128
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+async def call(app, method, path, body=None, query=''):
+    """One request through the ASGI app; returns (status, parsed JSON body)"""
+    payload = json.dumps(body).encode() if body is not None else b''
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('localhost', 5050),
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())],
+    }
+    received = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if received:
+            return received.pop()
+        await asyncio.Event().wait()  # no disconnect while the response is sent
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    content = b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+    return sent[0]['status'], json.loads(content)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds every upstream quote call takes')
+    parser.add_argument('--threads', type=int, default=8, help='worker threads of the threaded server, and DB_THREADS')
+    parser.add_argument('--clients', default='8,32,128', help='comma-separated concurrency levels for the ASGI app')
+    parser.add_argument('--requests', type=int, default=256, help='requests per run')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'async.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    os.environ['WARMUP_ON_START'] = '0'
+    os.environ['SYNTHETIC_LATENCY'] = str(args.latency)
+    os.environ['DB_THREADS'] = str(args.threads)
+    os.environ['QUOTE_MAX_CONCURRENT'] = str(max(int(n) for n in args.clients.split(',')))
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    import asgi
+
+    fresh = (f"Q{n:05d}" for n in itertools.count())
+    cap = args.threads / args.latency
+    rows = []
+
+    # Threaded WSGI: each worker thread is held for the whole upstream call
+    paths = [f'/api/search/{next(fresh)}' for _ in range(args.requests)]
+    lock = threading.Lock()
+    peak = []
+
+    def worker():
+        client = backend.app.test_client()
+        while True:
+            with lock:
+                if not paths:
+                    return
+                path = paths.pop()
+            assert client.get(path).status_code == 200
+            peak.append(threading.active_count())
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    rate = args.requests / (time.perf_counter() - started)
+    rows.append((f"wsgi, {args.threads} threads", 'blocking', 'search', rate, max(peak)))
+
+    async def run(clients, make_request):
+        requests = [make_request() for _ in range(args.requests)]
+        queue = iter(requests)
+
+        async def client():
+            for method, path, body, query in queue:
+                status, content = await call(asgi.app, method, path, body, query)
+                assert status in (200, 201), content
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return args.requests / (time.perf_counter() - started)
+
+    async def asgi_runs():
+        results = []
+        # Buys go to an account that can afford them all
+        _, account = await call(asgi.app, 'POST', '/api/accounts', {"starting_balance": 1e9})
+        buyer = f"account_id={account['id']}"
+        for provider in ('awaiting', 'blocking'):
+            backend.quote_cache.source_async = backend.market_data.info_async if provider == 'awaiting' else None
+            for clients in [int(n) for n in args.clients.split(',')]:
+                rate = await run(clients, lambda: ('GET', f'/api/search/{next(fresh)}', None, ''))
+                results.append((f"asgi, {clients} clients", provider, 'search', rate, threading.active_count()))
+                rate = await run(clients, lambda: ('POST', '/api/stocks', {"symbol": next(fresh), "quantity": 1}, buyer))
+                results.append((f"asgi, {clients} clients", provider, 'buy', rate, threading.active_count()))
+        for clients in [int(n) for n in args.clients.split(',')]:
+            rate = await run(clients, lambda: ('GET', f'/api/stocks/{next(fresh)}', None, ''))
+            results.append((f"asgi, {clients} clients", 'blocking', 'detail', rate, threading.active_count()))
+        backend.quote_cache.source_async = backend.market_data.info_async
+
+        # Concurrent lookups of one cold symbol share one upstream call
+        calls = backend.market_data.calls
+        symbol = next(fresh)
+        await asyncio.gather(*(call(asgi.app, 'GET', f'/api/search/{symbol}') for _ in range(64)))
+        return results, backend.market_data.calls - calls
+
+    results, coalesced_calls = asyncio.run(asgi_runs())
+    rows += results
+
+    print(f"upstream latency {args.latency * 1000:.0f} ms, thread cap {cap:.0f} req/s")
+    print(f"{'server':<22}{'provider':<10}{'request':<10}{'req/s':>10}{'threads':>9}")
+    for name, provider, kind, rate, thread_count in rows:
+        print(f"{name:<22}{provider:<10}{kind:<10}{rate:>10.1f}{thread_count:>9}")
+    print(f"64 concurrent lookups of one symbol: {coalesced_calls} upstream call(s)")
+
+    failures = []
+    for provider, kind in (('awaiting', 'search'), ('blocking', 'search'), ('blocking', 'detail')):
+        best = max(r[3] for r in rows if r[0].startswith('asgi') and r[1:3] == (provider, kind))
+        if best < 2 * cap:
+            failures.append(f"ASGI {kind} ({provider}) peaked at {best:.1f} req/s, under twice the {cap:.0f} req/s thread cap")
+    if coalesced_calls != 1:
+        failures.append(f"{coalesced_calls} upstream calls for one symbol")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
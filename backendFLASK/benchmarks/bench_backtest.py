@@ -0,0 +1,107 @@
+"""
+Backtest sweep throughput. Stores synthetic closes for --symbols symbols over --years years,
+posts one /api/backtest sweep of --scenarios random target-weight portfolios (random
+rebalance periods and costs) and times it from the POST to the finished job, once per
+--workers setting. Also checks a few scenarios against a plain day-by-day simulation that
+holds shares and rebalances them one day at a time.
+
+Run from backendFLASK/:  python benchmarks/bench_backtest.py --scenarios 1000 --workers 1,4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def reference_equity(prices, weights, rebalance_days, cost_bps, cash):
+    """Day-by-day simulation: buy the weights on day 0, trade back to them every rebalance_days closes"""
+    n_days = len(prices)
+    shares = np.zeros(prices.shape[1])
+    equity = np.empty(n_days)
+    for t in range(n_days):
+        value = cash + shares @ prices[t]
+        if t == 0 or (rebalance_days and t % rebalance_days == 0 and t < n_days - 1):
+            fee = np.abs(weights * value / prices[t] - shares) @ prices[t] * cost_bps / 10000.0
+            shares = weights * (value - fee) / prices[t]
+            cash = value - fee - shares @ prices[t]
+        equity[t] = cash + shares @ prices[t]
+    return equity
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--workers', default=f"1,{os.cpu_count() or 1}", help='comma-separated pool sizes to time')
+    parser.add_argument('--check', type=int, default=5, help='scenarios compared with the day-by-day simulation')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'backtest.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    os.environ['WARMUP_ON_START'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    from load_api import insert_closes
+    from models import db
+
+    with backend.app.app_context():
+        closes = insert_closes(backend, args.symbols, args.years)
+        db.session.commit()
+    symbols = list(closes.columns)
+    print(f"{args.symbols} symbols x {len(closes)} days of closes, {args.scenarios} scenarios")
+
+    rng = np.random.default_rng(args.seed)
+    weights = rng.dirichlet(np.ones(len(symbols)), size=args.scenarios) * rng.uniform(0.5, 1.0, (args.scenarios, 1))
+    periods = rng.choice([0, 1, 5, 21, 63], size=args.scenarios)
+    costs = rng.choice([0.0, 5.0, 10.0, 25.0], size=args.scenarios)
+    body = {"starting_cash": 100000.0, "scenarios": [
+        {"weights": dict(zip(symbols, w.tolist())), "rebalance_days": int(k), "cost_bps": float(c)}
+        for w, k, c in zip(weights, periods, costs)
+    ]}
+
+    client = backend.app.test_client()
+    result = None
+    for workers in [int(n) for n in args.workers.split(',')]:
+        backend.app.config['BACKTEST_WORKERS'] = workers
+        started = time.perf_counter()
+        response = client.post('/api/backtest', json=body)
+        assert response.status_code == 202, response.get_data(as_text=True)
+        queued = time.perf_counter() - started
+        job_id = response.get_json()['job_id']
+        while True:
+            job = client.get(f'/api/jobs/{job_id}').get_json()
+            if job['status'] not in ('queued', 'running'):
+                break
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - started
+        assert job['status'] == 'done', job
+        result = job['result']
+        print(f"{workers:>3} workers: {elapsed:6.2f} s ({queued:.2f} s to queue), "
+              f"{args.scenarios / elapsed:8.0f} scenarios/s")
+
+    # The best scenario comes back with its curve; the rest are checked on final value
+    prices = closes.loc[result['dates']].to_numpy(dtype=float)
+    checked = [result['best']['scenario']] + rng.choice(args.scenarios, size=max(args.check - 1, 0), replace=False).tolist()
+    worst = 0.0
+    for i in dict.fromkeys(checked):
+        expected = reference_equity(prices, weights[i], int(periods[i]), costs[i], 100000.0)
+        got = result['scenarios'][i]['final_value']
+        worst = max(worst, abs(got - expected[-1]) / expected[-1])
+        if i == result['best']['scenario']:
+            worst = max(worst, float(np.max(np.abs(np.array(result['best']['equity_curve']) - expected) / expected)))
+    print(f"largest relative difference from the day-by-day simulation: {worst:.2e}")
+    if worst > 1e-6:
+        print("FAIL: results differ")
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
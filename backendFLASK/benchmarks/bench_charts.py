@@ -0,0 +1,106 @@
+"""
+Chart payload size and latency. Compares the full-history responses (every daily bar as a
+record, every portfolio value as a dict) with the range/max_points chart endpoints, cold
+(chart caches empty) and warm. Fails if a chart comes back with more points than asked for,
+or if storing a close for the symbol doesn't rebuild its chart.
+
+Run from backendFLASK/:  python benchmarks/bench_charts.py --years 5 --max-points 500
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--years', type=int, default=5, help='years of portfolio history to seed')
+    parser.add_argument('--trades', type=int, default=2000)
+    parser.add_argument('--symbols', type=int, default=50)
+    parser.add_argument('--max-points', type=int, default=500)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'charts.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    os.environ['WARMUP_ON_START'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    import pandas as pd
+    from load_api import seed
+    from price_store import upsert_closes
+
+    with backend.app.app_context():
+        seeded = seed(backend, args.trades, args.symbols, args.years, 0)
+    symbol = 'S0000'
+    client = backend.app.test_client()
+    print(f"seeded {seeded['transactions']} transactions over {args.years} years")
+
+    def clear():
+        backend.chart_cache.clear()
+        backend.chart_bars_cache.clear()
+        backend.response_cache.clear()
+
+    def measure(path, cold):
+        samples, size = [], 0
+        for _ in range(args.repeats):
+            if cold:
+                clear()
+            started = time.perf_counter()
+            response = client.get(path)
+            samples.append((time.perf_counter() - started) * 1000)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            size = len(response.get_data())
+        return statistics.median(samples), size, response
+
+    def full_history(period):
+        # What /api/stocks/<ticker> returns, for the whole range
+        bars = backend.market_data.history(symbol, period=period)
+        return json.dumps(bars.reset_index().to_dict(orient='records'), default=str).encode()
+
+    failures = []
+    rows = []
+    for range_ in ('1y', f'{args.years}y', 'max'):
+        legacy = len(full_history(range_))
+        for kind in ('candles', 'line'):
+            path = f'/api/stocks/{symbol}/chart?range={range_}&max_points={args.max_points}&type={kind}'
+            cold, size, response = measure(path, cold=True)
+            warm, _, _ = measure(path, cold=False)
+            body = response.get_json()
+            rows.append((f"{symbol} {range_} {kind}", legacy, size, body['points'], cold, warm))
+            if body['points'] > args.max_points:
+                failures.append(f"{path}: {body['points']} points")
+
+    legacy = measure('/api/portfolio/value', cold=False)[1]
+    path = f'/api/portfolio/value/chart?range=max&max_points={args.max_points}'
+    cold, size, response = measure(path, cold=True)
+    warm, _, _ = measure(path, cold=False)
+    rows.append(("portfolio value max", legacy, size, response.get_json()['points'], cold, warm))
+
+    print(f"{'chart':<26}{'full bytes':>12}{'chart bytes':>13}{'points':>8}{'cold ms':>9}{'warm ms':>9}")
+    for name, legacy, size, points, cold, warm in rows:
+        print(f"{name:<26}{legacy:>12}{size:>13}{points:>8}{cold:>9.2f}{warm:>9.2f}")
+
+    # A stored close for the symbol must rebuild its cached chart even within the TTL
+    path = f'/api/stocks/{symbol}/chart?range=1y'
+    etag = client.get(path).headers['ETag']
+    with backend.app.app_context():
+        upsert_closes(pd.DataFrame({symbol: [1.0]}, index=['2000-01-03']))
+        backend.db.session.commit()
+    if client.get(path, headers={'If-None-Match': etag}).status_code != 200:
+        failures.append("chart not invalidated by a stored close")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
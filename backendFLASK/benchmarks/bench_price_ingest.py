@@ -0,0 +1,89 @@
+"""
+Ingest benchmark for Portfolio closing prices: per-cell SELECT + add (the old path)
+against one bulk INSERT ... ON CONFLICT statement.
+
+Run from backendFLASK/:  python benchmarks/bench_price_ingest.py --symbols 500 --days 252
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Portfolio  # noqa: E402
+from price_store import upsert_closes  # noqa: E402
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+
+def synthetic_closes(n_symbols, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2024-12-31', periods=n_days)
+    symbols = [f'S{i:04d}' for i in range(n_symbols)]
+    returns = rng.normal(0, 0.02, size=(n_days, n_symbols))
+    return pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=dates, columns=symbols)
+
+
+def per_cell_ingest(close_frame):
+    """The old startup loop: one SELECT per (date, symbol) cell"""
+    for date, row in close_frame.iterrows():
+        date_str = date.strftime('%Y-%m-%d')
+        for symbol in close_frame.columns:
+            price = row.get(symbol)
+            if pd.isna(price):
+                continue
+            exists = Portfolio.query.filter_by(symbol=symbol, date=date_str).first()
+            if not exists:
+                db.session.add(Portfolio(symbol=symbol, date=date_str, closing_price=price))
+    db.session.commit()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--days', type=int, default=252)
+    parser.add_argument('--legacy-symbols', type=int, default=25,
+                        help='symbols to run through the slow per-cell path (it is extrapolated to --symbols)')
+    args = parser.parse_args()
+
+    frame = synthetic_closes(args.symbols, args.days)
+    cells = int(frame.notna().sum().sum())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+
+            bulk = timed(lambda: (upsert_closes(frame), db.session.commit()))
+            rerun = timed(lambda: (upsert_closes(frame), db.session.commit()))
+
+            Portfolio.query.delete()
+            db.session.commit()
+            legacy_frame = frame.iloc[:, :args.legacy_symbols]
+            legacy = timed(per_cell_ingest, legacy_frame) * args.symbols / legacy_frame.shape[1]
+
+    print(f'{args.symbols} symbols x {args.days} days = {cells} closes')
+    print(f'bulk upsert (empty table):    {bulk:8.3f} s')
+    print(f'bulk upsert (all conflicts):  {rerun:8.3f} s')
+    print(f'per-cell SELECT (estimated):  {legacy:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Storage layout benchmark for close-price history: the current one-row-per-(symbol, date)
+Portfolio layout against columnar layouts (a wide SQLite table with one column per symbol,
+and Parquet when pyarrow is installed).
+
+Reports write time, file size, reading the full dates x symbols matrix and reading one symbol.
+
+Run from backendFLASK/:  python benchmarks/bench_price_storage.py --symbols 1000 --years 10
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_closes(n_symbols, n_days, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2024-12-31', periods=n_days).strftime('%Y-%m-%d')
+    symbols = [f'S{i:04d}' for i in range(n_symbols)]
+    returns = rng.normal(0, 0.02, size=(n_days, n_symbols))
+    return pd.DataFrame(100 * np.exp(np.cumsum(returns, axis=0)), index=dates, columns=symbols)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def bench_rows(path, frame):
+    """Same shape as the Portfolio table: one row per close, unique (symbol, date) index"""
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE portfolio (id INTEGER PRIMARY KEY, symbol VARCHAR(10) NOT NULL, "
+                "date VARCHAR(10) NOT NULL, closing_price FLOAT NOT NULL)")
+    con.execute("CREATE UNIQUE INDEX uq_portfolio_symbol_date ON portfolio (symbol, date)")
+    long = frame.stack().reset_index()
+
+    def write():
+        con.executemany("INSERT INTO portfolio (date, symbol, closing_price) VALUES (?, ?, ?)",
+                        long.itertuples(index=False, name=None))
+        con.commit()
+
+    def read_all():
+        df = pd.read_sql_query("SELECT date, symbol, closing_price FROM portfolio", con)
+        return df.pivot(index='date', columns='symbol', values='closing_price')
+
+    def read_one():
+        return pd.read_sql_query("SELECT date, closing_price FROM portfolio WHERE symbol = 'S0000' ORDER BY date", con)
+
+    results = (timed(write)[0], timed(read_all)[0], timed(read_one)[0])
+    con.close()
+    return results
+
+
+def bench_wide(path, frame):
+    """Columnar in SQLite: one row per date, one REAL column per symbol"""
+    con = sqlite3.connect(path)
+    columns = ', '.join(f'"{s}" REAL' for s in frame.columns)
+    con.execute(f"CREATE TABLE closes (date VARCHAR(10) PRIMARY KEY, {columns})")
+    placeholders = ', '.join('?' * (len(frame.columns) + 1))
+
+    def write():
+        con.executemany(f"INSERT INTO closes VALUES ({placeholders})",
+                        frame.reset_index().itertuples(index=False, name=None))
+        con.commit()
+
+    def read_all():
+        return pd.read_sql_query("SELECT * FROM closes", con, index_col='date')
+
+    def read_one():
+        return pd.read_sql_query('SELECT date, "S0000" FROM closes ORDER BY date', con)
+
+    results = (timed(write)[0], timed(read_all)[0], timed(read_one)[0])
+    con.close()
+    return results
+
+
+def bench_parquet(path, frame):
+    def write():
+        frame.to_parquet(path)
+
+    def read_all():
+        return pd.read_parquet(path)
+
+    def read_one():
+        return pd.read_parquet(path, columns=['S0000'])
+
+    return timed(write)[0], timed(read_all)[0], timed(read_one)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=10)
+    args = parser.parse_args()
+
+    frame = synthetic_closes(args.symbols, args.years * 252)
+    layouts = [('per-row (current)', 'rows.db', bench_rows), ('wide SQLite table', 'wide.db', bench_wide)]
+    try:
+        import pyarrow  # noqa: F401
+        layouts.append(('parquet', 'closes.parquet', bench_parquet))
+    except ImportError:
+        print('(pyarrow not installed, skipping parquet)')
+
+    print(f'{args.symbols} symbols x {len(frame)} days = {frame.size} closes\n')
+    print(f"{'layout':<22}{'write s':>10}{'size MB':>10}{'read all s':>12}{'read 1 s':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, filename, bench in layouts:
+            path = os.path.join(tmp, filename)
+            write, read_all, read_one = bench(path, frame)
+            size = os.path.getsize(path) / 1e6
+            print(f'{name:<22}{write:>10.2f}{size:>10.1f}{read_all:>12.2f}{read_one:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Timing for /api/portfolio/risk against a scratch database seeded with synthetic closes
+(200 positions x 5 years of business days by default, plus the benchmark symbol) and a
+buy per position spread over the first year.
+
+Reports the first call (value snapshots not persisted yet), a cold call with snapshots in
+place but an empty risk cache, and warm repeat calls served from the cache.
+
+Run from backendFLASK/:  python benchmarks/bench_risk.py --positions 200 --years 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--positions', type=int, default=200)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--target-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'risk.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    import risk
+    from models import db, DEFAULT_ACCOUNT_ID, Portfolio, Transactions
+
+    n_days = 252 * args.years
+    end = (pd.Timestamp.now(tz='UTC').normalize() - pd.Timedelta(days=1)).tz_localize(None)
+    dates = pd.bdate_range(end=end, periods=n_days)
+    symbols = [f'S{i:03d}' for i in range(args.positions)]
+    benchmark = backend.app.config['RISK_BENCHMARK']
+
+    rng = np.random.default_rng(0)
+    market = rng.normal(0.0003, 0.01, size=(n_days, 1))
+    returns = market * rng.uniform(0.5, 1.5, size=(1, args.positions + 1)) \
+        + rng.normal(0, 0.015, size=(n_days, args.positions + 1))
+    returns[:, -1] = market[:, 0]
+    closes = 50 * np.exp(np.cumsum(returns, axis=0))
+
+    day_strings = dates.strftime('%Y-%m-%d')
+    price_rows = [
+        {"symbol": symbol, "date": day, "closing_price": float(closes[i, j])}
+        for j, symbol in enumerate(symbols + [benchmark])
+        for i, day in enumerate(day_strings)
+    ]
+    buy_days = rng.integers(0, min(252, n_days), size=args.positions)
+    trade_rows = [
+        {"account_id": DEFAULT_ACCOUNT_ID, "symbol": symbol, "type": 'BUY', "quantity": 2, "purchase_price": float(closes[d, j]),
+         "total_amount": 2 * float(closes[d, j]), "date": dates[d].to_pydatetime()}
+        for j, (symbol, d) in enumerate(zip(symbols, buy_days))
+    ]
+
+    with backend.app.app_context():
+        db.session.execute(db.insert(Portfolio.__table__), price_rows)
+        db.session.execute(db.insert(Transactions.__table__), trade_rows)
+        db.session.commit()
+    print(f"seeded {len(price_rows)} closes, {len(trade_rows)} transactions")
+
+    client = backend.app.test_client()
+
+    def timed_call():
+        started = time.perf_counter()
+        response = client.get('/api/portfolio/risk')
+        elapsed = (time.perf_counter() - started) * 1000
+        assert response.status_code == 200, response.get_json()
+        return elapsed, response.get_json()
+
+    first_ms, body = timed_call()
+    risk._cache.clear()
+    cold_ms, body = timed_call()
+    warm = [timed_call()[0] for _ in range(args.repeats)]
+
+    print(f"first call (builds value snapshots): {first_ms:8.1f} ms")
+    print(f"cold (empty risk cache):             {cold_ms:8.1f} ms")
+    print(f"warm (cached) median:                {statistics.median(warm):8.1f} ms")
+    p = body['portfolio']
+    print(f"volatility {p['annualized_volatility']}, sharpe {p['sharpe_ratio']}, beta {p['beta']}, "
+          f"max drawdown {p['max_drawdown']['value']}, VaR95 hist {p['var']['historical']['pct']}")
+    print(f"positions {len(body['positions'])}, returns {len(body['returns'])}, "
+          f"correlation {len(body['correlation']['matrix'])}x{len(body['correlation']['symbols'])}")
+    print('ok' if cold_ms < args.target_ms else f"cold path over {args.target_ms:.0f} ms target")
+
+
+if __name__ == '__main__':
+    main()
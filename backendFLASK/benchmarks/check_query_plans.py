@@ -0,0 +1,72 @@
+"""
+Checks that the hot lookup queries are answered from an index: EXPLAIN QUERY PLAN must name
+an index and must not need a temp B-tree for sorting. Exits non-zero if any query regresses.
+
+Run from backendFLASK/:  python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+from flask import Flask
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, LotSale, Portfolio, PortfolioSnapshot, Stock, TaxLot, Transactions  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+
+
+def hot_queries():
+    """The lookups made on every buy/sell, price ingest and history endpoint; all but prices are per account"""
+    return {
+        "Stock by symbol (buy/sell)": Stock.query.filter_by(account_id=7, symbol='AAPL'),
+        "Portfolio by (symbol, date)": Portfolio.query.filter_by(symbol='AAPL', date='2024-01-02'),
+        "Transactions by date (portfolio value)":
+            Transactions.query.filter_by(account_id=7).order_by(Transactions.date, Transactions.id),
+        "Transactions newest first (history)":
+            Transactions.query.filter_by(account_id=7).order_by(Transactions.date.desc(), Transactions.id.desc()),
+        "Transactions of one symbol by date":
+            Transactions.query.filter_by(account_id=7, symbol='AAPL').order_by(Transactions.date),
+        "Open lots of one symbol (sell)":
+            TaxLot.query.filter(TaxLot.account_id == 7, TaxLot.symbol == 'AAPL', TaxLot.remaining > 0)
+            .order_by(TaxLot.date, TaxLot.id),
+        "Lot sales by date (realized P&L)": LotSale.query.filter_by(account_id=7).order_by(LotSale.date),
+        "Portfolio snapshots by date": PortfolioSnapshot.query.filter_by(account_id=7).order_by(PortfolioSnapshot.date),
+    }
+
+
+def query_plan(query):
+    statement = query.statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    rows = db.session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def check_plans():
+    failures = 0
+    for name, query in hot_queries().items():
+        plan = query_plan(query)
+        ok = "INDEX" in plan and "TEMP B-TREE" not in plan
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}: {plan}")
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'plans.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            run_migrations()
+            # Give the planner statistics so it picks indexes the way it would on a real database
+            db.session.execute(text("ANALYZE"))
+            failures = check_plans()
+            db.session.remove()
+            db.engine.dispose()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""
+Load test for the API hot paths against a seeded database and the offline synthetic market.
+
+Seeds realistic volumes (default 10k transactions over 1k symbols with 3 years of daily closes;
+--transactions 1000000 for the large case), then fires each endpoint --requests times from
+--concurrency threads through the Flask test client and records latency percentiles and
+throughput. Reads repeated at one data version are answered from the response cache, so each
+endpoint is also called --cold-samples times with every cache cleared first; the median of
+those (cold_p50_ms) is what keeps the actual computation (valuation, FIFO replay, paging) timed.
+
+Results go to a JSON report (--report). With --baseline, a previous report is compared and the
+run fails when any endpoint's p50 or cold p50 regressed by more than --tolerance.
+
+Run from backendFLASK/:
+  python benchmarks/load_api.py --transactions 10000 --symbols 1000 --report bench_report.json
+  python benchmarks/load_api.py --db /tmp/big.db --transactions 1000000   # seeds once, reused after
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+Trade = namedtuple('Trade', 'id account_id symbol type quantity purchase_price date')
+
+
+def generate_trades(closes, n_trades, starting_cash, seed, account_id=1, first_id=1):
+    """
+    Random BUYs and SELLs at each day's close, in date order. A BUY needs the cash for it and a
+    SELL needs the shares, so the history is one the API itself could have produced. Half the
+    starting cash is never spent, which leaves room for the benchmark's own buys.
+    Transaction ids are numbered from first_id.
+    Returns the trades, the final cash and {symbol: (quantity, average purchase price)}.
+    """
+    rng = random.Random(seed)
+    days = sorted(rng.randrange(len(closes.index)) for _ in range(n_trades))
+    symbols = list(closes.columns)
+    column = {symbol: i for i, symbol in enumerate(symbols)}
+    prices = closes.to_numpy()
+    cash = starting_cash
+    held = {}
+    trades = []
+    for day in days:
+        date = closes.index[day].to_pydatetime() + timedelta(hours=14, seconds=rng.randrange(7200))
+        symbol = rng.choice(list(held)) if held and rng.random() < 0.45 else rng.choice(symbols)
+        price = float(prices[day, column[symbol]])
+        quantity = rng.randint(1, 5)
+        affordable = cash - quantity * price >= starting_cash / 2
+        if held and not affordable and symbol not in held:
+            symbol = rng.choice(list(held))
+            price = float(prices[day, column[symbol]])
+        if symbol in held and (rng.random() < 0.8 or not affordable):
+            qty, avg = held[symbol]
+            quantity = min(quantity, qty)
+            cash += quantity * price
+            held[symbol] = (qty - quantity, avg)
+            if held[symbol][0] == 0:
+                del held[symbol]
+            kind = 'SELL'
+        elif affordable:
+            qty, avg = held.get(symbol, (0, 0.0))
+            held[symbol] = (qty + quantity, (qty * avg + quantity * price) / (qty + quantity))
+            cash -= quantity * price
+            kind = 'BUY'
+        else:
+            continue
+        trades.append(Trade(first_id + len(trades), account_id, symbol, kind, quantity, round(price, 4), date))
+    return trades, cash, held
+
+
+def _insert(model, rows):
+    from models import db
+    if rows:
+        db.session.execute(db.insert(model.__table__), rows)
+
+
+def insert_closes(backend, n_symbols, years):
+    """Store synthetic closes (and their coverage) for n_symbols; returns the closes frame"""
+    from models import Portfolio, PriceCoverage
+
+    symbols = [f'S{i:04d}' for i in range(n_symbols)]
+    start = (datetime.now() - timedelta(days=365 * years)).strftime('%Y-%m-%d')
+    end = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    closes = backend.market_data.closes(symbols, start=start, end=end)
+
+    long = closes.stack().reset_index()
+    long.columns = ['date', 'symbol', 'closing_price']
+    long['date'] = long['date'].dt.strftime('%Y-%m-%d')
+    _insert(Portfolio, long.to_dict(orient='records'))
+    # Closes are already stored, so refreshes only look for days after `end`
+    now = datetime.now()
+    _insert(PriceCoverage, [{"symbol": s, "start": start, "end": end, "updated_at": now} for s in symbols])
+    return closes
+
+
+def insert_account_history(account_id, trades, held, first_lot_id=1):
+    """
+    Store an account's generated trades with the FIFO ledger a replay gives and the holdings they
+    leave; lot ids are numbered from first_lot_id. Returns (lots, sales) counts.
+    """
+    from ledger import replay
+    from models import LotSale, Stock, TaxLot, Transactions
+
+    lots, sales = replay(trades)
+    for i, lot in enumerate(lots, start=first_lot_id):
+        lot.id = i
+    _insert(Transactions, [{
+        "id": t.id, "account_id": account_id, "symbol": t.symbol, "type": t.type, "quantity": t.quantity,
+        "purchase_price": t.purchase_price, "total_amount": t.quantity * t.purchase_price, "date": t.date
+    } for t in trades])
+    _insert(TaxLot, [{
+        "id": lot.id, "account_id": account_id, "transaction_id": lot.transaction_id, "symbol": lot.symbol,
+        "date": lot.date, "price": lot.price, "quantity": lot.quantity, "remaining": lot.remaining
+    } for lot in lots])
+    _insert(LotSale, [{
+        "account_id": account_id, "sell_transaction_id": sale.sell_transaction_id, "lot_id": lot.id,
+        "symbol": sale.symbol, "date": sale.date, "quantity": sale.quantity, "buy_price": sale.buy_price,
+        "sell_price": sale.sell_price, "realized_pnl": sale.realized_pnl
+    } for lot, sale in sales])
+    _insert(Stock, [{"account_id": account_id, "symbol": s, "name": s, "quantity": q, "purchase_price": avg}
+                    for s, (q, avg) in held.items()])
+    return len(lots), len(sales)
+
+
+def seed(backend, n_trades, n_symbols, years, seed_value):
+    from models import db, Account, DEFAULT_ACCOUNT_ID
+
+    closes = insert_closes(backend, n_symbols, years)
+    account = db.session.get(Account, DEFAULT_ACCOUNT_ID)
+    trades, cash, held = generate_trades(closes, n_trades, account.starting_balance, seed_value, DEFAULT_ACCOUNT_ID)
+    lots, sales = insert_account_history(DEFAULT_ACCOUNT_ID, trades, held)
+    account.balance = cash
+    db.session.commit()
+    return {"transactions": len(trades), "symbols": n_symbols, "closes": int(closes.count().sum()),
+            "lots": lots, "lot_sales": sales, "holdings": len(held)}
+
+
+def percentiles(latencies_ms):
+    values = np.array(latencies_ms)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p90_ms": round(float(np.percentile(values, 90)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2),
+        "mean_ms": round(float(values.mean()), 2)
+    }
+
+
+def clear_caches(backend):
+    """Drop every in-process response cache so the next read is computed again"""
+    import risk
+    for cache in (backend.response_cache, backend.chart_cache, backend.chart_bars_cache):
+        cache.clear()
+    with risk._cache_lock:
+        risk._cache.clear()
+
+
+def run_endpoint(backend, name, make_request, n_requests, concurrency, cold_samples=5):
+    """cold_samples calls with the caches cleared before each, then n_requests more from `concurrency` threads"""
+    def timed(i):
+        client = backend.app.test_client()
+        started = time.perf_counter()
+        response = make_request(client, i)
+        return (time.perf_counter() - started) * 1000, response.status_code
+
+    cold = []
+    for i in range(max(cold_samples, 1)):
+        clear_caches(backend)
+        cold.append(timed(-1 - i))
+    cold_ms, cold_status = cold[0]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(1, n_requests + 1)))
+    wall = time.perf_counter() - started
+
+    statuses = Counter(status for _, status in results + cold)
+    result = {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "cold_ms": round(cold_ms, 2),
+        "cold_p50_ms": round(float(np.median([ms for ms, _ in cold])), 2),
+        **percentiles([ms for ms, _ in results]),
+        "throughput_rps": round(n_requests / wall, 1),
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": sum(v for k, v in statuses.items() if k >= 500)
+    }
+    print(f"{name:<28} cold {result['cold_ms']:9.1f}  cold p50 {result['cold_p50_ms']:9.1f}  p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  "
+          f"p99 {result['p99_ms']:8.1f} ms  {result['throughput_rps']:8.1f} req/s  {result['status_codes']}")
+    return result
+
+
+def endpoints(backend, symbols):
+    """name -> request(client, i); reads first, then the trades that change the data under them"""
+    from models import Transactions
+    with backend.app.app_context():
+        count = Transactions.query.count()
+        middle = Transactions.query.order_by(Transactions.date, Transactions.id).offset(count // 2).first()
+        mid_cursor = backend.encode_cursor(middle) if middle else None
+    held = symbols or ['S0000']
+    # Validators a client would hold from an earlier response; unchanged data answers 304
+    client = backend.app.test_client()
+    etags = {path: client.get(path).headers.get('ETag') for path in ('/api/stocks', '/api/portfolio/value')}
+
+    return {
+        "portfolio_value": lambda c, i: c.get('/api/portfolio/value'),
+        "realized_pnl": lambda c, i: c.get('/api/portfolio/realized-pnl'),
+        "realized_pnl_by_symbol": lambda c, i: c.get('/api/portfolio/realized-pnl?breakdown=symbol'),
+        "transactions_first_page": lambda c, i: c.get('/api/transactions?limit=50'),
+        "transactions_deep_page": lambda c, i: c.get(f'/api/transactions?limit=50&cursor={mid_cursor}'),
+        "transactions_by_symbol": lambda c, i: c.get(f'/api/transactions?limit=50&symbol={held[i % len(held)]}'),
+        "stocks": lambda c, i: c.get('/api/stocks'),
+        "portfolio_risk": lambda c, i: c.get('/api/portfolio/risk'),
+        "stocks_revalidate": lambda c, i: c.get('/api/stocks', headers={'If-None-Match': etags['/api/stocks']}),
+        "portfolio_value_revalidate": lambda c, i: c.get('/api/portfolio/value', headers={'If-None-Match': etags['/api/portfolio/value']}),
+        "buy": lambda c, i: c.post('/api/stocks', json={"symbol": held[i % len(held)], "quantity": 1}),
+        "sell": lambda c, i: c.delete('/api/stocks/delete_by_symbol', json={"symbol": held[i % len(held)], "quantity": 1}),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Endpoints whose p50 or cold p50 got slower than the baseline by more than tolerance (a fraction)"""
+    regressions = []
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name) or {}
+        for metric in ("p50_ms", "cold_p50_ms"):
+            if not before.get(metric) or metric not in result:
+                continue
+            change = result[metric] / before[metric] - 1
+            print(f"{name:<28} {metric:<12} {before[metric]:8.1f} -> {result[metric]:8.1f} ms ({change:+.0%})")
+            if change > tolerance:
+                regressions.append({"endpoint": name, "metric": metric, f"baseline_{metric}": before[metric],
+                                    metric: result[metric], "change": round(change, 4)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--symbols', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200, help='requests per endpoint after the cold call')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--cold-samples', type=int, default=5, help='calls per endpoint with the response caches cleared')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--upstream-latency', type=float, default=0.0, help='seconds added to every synthetic market call')
+    parser.add_argument('--db', help='database file to use; seeded only if it has no transactions yet')
+    parser.add_argument('--only', help='comma separated endpoint names')
+    parser.add_argument('--report', default='bench_report.json')
+    parser.add_argument('--baseline', help='previous report to compare p50 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p50 slowdown vs the baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'load.db')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(path)}"
+    os.environ['MARKET_DATA_PROVIDER'] = 'synthetic'
+    os.environ['SYNTHETIC_SEED'] = str(args.seed)
+    os.environ['SYNTHETIC_LATENCY'] = str(args.upstream_latency)
+    os.environ['WARMUP_ON_START'] = '0'
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    from models import Stock, Transactions
+
+    with backend.app.app_context():
+        seeded = None
+        started = time.perf_counter()
+        if Transactions.query.count() == 0:
+            seeded = seed(backend, args.transactions, args.symbols, args.years, args.seed)
+            print(f"seeded {seeded} in {time.perf_counter() - started:.1f} s")
+        transactions = Transactions.query.count()
+        symbols = [s.symbol for s in Stock.query.order_by(Stock.symbol).limit(50)]
+
+    selected = endpoints(backend, symbols)
+    if args.only:
+        selected = {name: selected[name] for name in args.only.split(',')}
+
+    results = {}
+    for name, make_request in selected.items():
+        results[name] = run_endpoint(backend, name, make_request, args.requests, args.concurrency, args.cold_samples)
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "dataset": {"transactions": transactions, "symbols": args.symbols, "years": args.years,
+                    "seeded": seeded, "database": path},
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "cold_samples": args.cold_samples, "seed": args.seed,
+                     "upstream_latency": args.upstream_latency},
+        "environment": {"python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+                        "platform": platform.platform()},
+        "results": results
+    }
+
+    failed = defaultdict(list)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed["regressions"] = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = failed["regressions"]
+    failed["errors"] = [name for name, r in results.items() if r["errors"]]
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.report}")
+
+    if failed["regressions"] or failed["errors"]:
+        print(f"FAILED: {dict(failed)}")
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Load test for /api/stream fan-out: many simulated subscribers on one shared poller.
+Checks that upstream quote fetches scale with ticks x held symbols, not with subscribers,
+and that slow subscribers are coalesced to a snapshot instead of buffering without bound.
+
+Run from backendFLASK/:  python benchmarks/load_stream.py --subscribers 500 --ticks 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--slow', type=int, default=50, help='subscribers that never read until the end')
+    parser.add_argument('--ticks', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.1)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'stream.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    from quotes import FakeQuoteSource
+
+    symbols = ['AAA', 'BBB', 'CCC', 'DDD', 'EEE']
+    source = FakeQuoteSource({s: {"symbol": s, "currentPrice": 10.0} for s in symbols})
+    backend.quote_cache.source = source
+    client = backend.app.test_client()
+    for s in symbols:
+        client.post('/api/stocks', json={"symbol": s, "quantity": 10})
+
+    # Every tick must go upstream so the count is exact
+    backend.quote_cache.ttl = 0
+    hub = backend.stream_hubs.get(backend.DEFAULT_ACCOUNT_ID)
+    hub.interval = args.interval
+    hub.max_queue = 10
+
+    subscribers = [hub.subscribe() for _ in range(args.subscribers)]
+    fast, slow = subscribers[args.slow:], subscribers[:args.slow]
+    received = {id(s): 0 for s in subscribers}
+    stop = threading.Event()
+
+    def consume(subscriber):
+        while not stop.is_set():
+            received[id(subscriber)] += sum(m.startswith('event: update') for m in hub.next_messages(subscriber, 0.5))
+
+    threads = [threading.Thread(target=consume, args=(s,), daemon=True) for s in fast]
+    for t in threads:
+        t.start()
+
+    rng = random.Random(3)
+    source.calls = 0
+    start_ticks = hub.ticks
+    started = time.perf_counter()
+    while hub.ticks - start_ticks < args.ticks:
+        for s in symbols:
+            source.set_price(s, round(rng.uniform(5, 15), 2))
+        time.sleep(args.interval / 4)
+    elapsed = time.perf_counter() - started
+    ticks = hub.ticks - start_ticks
+    upstream = source.calls
+
+    time.sleep(args.interval)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    slow_backlog = max(s.queue.qsize() for s in slow) if slow else 0
+    slow_coalesced = all(s.needs_snapshot or s.dropped for s in slow)
+    fast_updates = [received[id(s)] for s in fast]
+    for s in subscribers:
+        hub.unsubscribe(s)
+
+    print(f"{args.subscribers} subscribers ({args.slow} slow), {ticks} ticks in {elapsed:.2f} s")
+    print(f"upstream quote fetches: {upstream} (ticks x symbols = {ticks * len(symbols)})")
+    print(f"updates per fast subscriber: min {min(fast_updates)}, max {max(fast_updates)}")
+    print(f"slow subscribers: max backlog {slow_backlog}/{hub.max_queue}, coalesced to snapshot: {slow_coalesced}")
+
+    # Allow one in-flight tick at each end of the measured window
+    ok = upstream <= (ticks + 1) * len(symbols) and slow_backlog <= hub.max_queue and slow_coalesced
+    print("ok" if ok else "FAIL")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
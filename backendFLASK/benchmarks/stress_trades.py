@@ -0,0 +1,101 @@
+"""
+Fires hundreds of parallel buy/sell orders through the Flask test client against a scratch
+database and checks that cash and share counts are conserved:
+
+  balance   == starting balance - sum(BUY amounts) + sum(SELL amounts), and never negative
+  quantity  == sum(BUY quantities) - sum(SELL quantities) per symbol
+  the FIFO lot ledger matches a full replay
+
+Run from backendFLASK/:  python benchmarks/stress_trades.py --orders 400 --threads 16
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--balance', type=float, default=5000.0,
+                        help='starting cash; kept low so buys compete for funds')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'stress.db')}"
+    os.environ.setdefault('MARKET_DATA_PROVIDER', 'synthetic')  # never touch the network
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import app as backend
+    from models import db, Account, Stock, Transactions
+    from ledger import verify_ledger
+    from quotes import FakeQuoteSource
+
+    symbols = ['AAA', 'BBB', 'CCC']
+    backend.quote_cache.source = FakeQuoteSource({s: {"symbol": s, "currentPrice": 10.0 * (i + 1)}
+                                                  for i, s in enumerate(symbols)})
+    with backend.app.app_context():
+        Account.query.first().balance = args.balance
+        db.session.commit()
+
+    rng = random.Random(7)
+    plan = [(rng.choice(['buy', 'sell', 'batch']), rng.choice(symbols), rng.randint(1, 5)) for _ in range(args.orders)]
+
+    def fire(order):
+        kind, symbol, quantity = order
+        client = backend.app.test_client()
+        if kind == 'buy':
+            r = client.post('/api/stocks', json={"symbol": symbol, "quantity": quantity})
+        elif kind == 'sell':
+            r = client.delete('/api/stocks/delete_by_symbol', json={"symbol": symbol, "quantity": quantity})
+        else:
+            other = rng.choice(symbols)
+            r = client.post('/api/orders/batch', json={"orders": [
+                {"symbol": symbol, "side": "BUY", "quantity": quantity},
+                {"symbol": other, "side": "SELL", "quantity": 1},
+            ]})
+        return r.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        statuses = list(pool.map(fire, plan))
+    elapsed = time.perf_counter() - started
+
+    failures = []
+    with backend.app.app_context():
+        balance = Account.query.first().balance
+        cash = args.balance
+        shares = defaultdict(int)
+        for t in Transactions.query.all():
+            sign = 1 if t.type == 'BUY' else -1
+            cash -= sign * t.total_amount
+            shares[t.symbol] += sign * t.quantity
+        held = {s.symbol: s.quantity for s in Stock.query.all()}
+
+        if abs(balance - cash) > 1e-6:
+            failures.append(f"balance {balance} != replayed cash {cash}")
+        if balance < 0:
+            failures.append(f"account overdrawn: {balance}")
+        for symbol in symbols:
+            if held.get(symbol, 0) != shares[symbol]:
+                failures.append(f"{symbol}: holding {held.get(symbol, 0)} != replayed {shares[symbol]}")
+        failures += [f"ledger mismatch {m}" for m in verify_ledger()]
+
+    counts = defaultdict(int)
+    for status in statuses:
+        counts[status] += 1
+    print(f"{args.orders} orders on {args.threads} threads in {elapsed:.2f} s, status codes {dict(counts)}")
+    print(f"final balance {balance:.2f}, holdings {held}")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("conserved" if not failures else "NOT conserved")
+    sys.exit(1 if failures or counts.get(500) else 0)
+
+
+if __name__ == '__main__':
+    main()
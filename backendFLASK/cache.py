@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, DataVersion
+
+# Stored closes are shared by every account, so price ingestion has one counter of its own
+PRICES = 'prices'
+
+
+def account_key(account_id):
+    """Counter bumped by an account's trades"""
+    return f"account:{account_id}"
+
+
+def symbol_key(symbol):
+    """Counter bumped whenever closes of one symbol are written (chart caches key on it)"""
+    return f"prices:{symbol}"
+
+
+def bump_version(*names):
+    """
+    Increment data versions inside the caller's transaction (the caller commits), so the new
+    versions become visible to every worker together with the write that caused them
+    """
+    if not names:
+        return
+    stmt = insert(DataVersion.__table__).on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': DataVersion.__table__.c.version + 1}
+    )
+    db.session.execute(stmt, [{"name": name, "version": 1} for name in names])
+
+
+def current_version(account_id):
+    """
+    Version of everything an account's derived views read: its own trades and the shared closes,
+    as "trades.prices". One primary key query; a trade in another account doesn't change it.
+    """
+    rows = dict(db.session.query(DataVersion.name, DataVersion.version)
+                .filter(DataVersion.name.in_([account_key(account_id), PRICES])).all())
+    return f"{rows.get(account_key(account_id), 0)}.{rows.get(PRICES, 0)}"
+
+
+def symbol_version(symbol):
+    """Version of one symbol's stored closes"""
+    return db.session.query(DataVersion.version).filter(DataVersion.name == symbol_key(symbol)).scalar() or 0
+
+
+class ResponseCache:
+    """
+    In-process LRU of encoded response bodies, each stored with the data version it was built at.
+    A lookup at any other version is a miss and the rebuilt body replaces the old one, so writes
+    invalidate the cache just by bumping the version; stale bodies age out of the LRU.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key: (version, body)
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, version, build):
+        """Cached body for key at this version, or build() it (bytes) and keep it"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        body = build()
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,143 @@
+"""
+Chart payloads sized for the screen rather than the history: OHLC bars resampled up a
+resolution ladder until they fit max_points, and line series thinned with
+Largest-Triangle-Three-Buckets. Both come out columnar (parallel arrays).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from market_data import period_start
+
+DEFAULT_RANGE = '1y'
+# The periods yfinance's history() accepts; anything else fails upstream
+RANGES = ['1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max']
+DEFAULT_MAX_POINTS = 500
+MAX_POINTS_LIMIT = 5000
+# MarketDataProvider.history returns daily bars; the finer rungs are for intraday sources
+SOURCE_RESOLUTION = '1d'
+
+# (name, pandas rule, bars per calendar day of trading) from finest to coarsest.
+# Bins are labelled by their first instant: a week by its Monday, a month by its 1st, and so on.
+RESOLUTIONS = [
+    ('1m', '1min', 390 * 252 / 365),
+    ('5m', '5min', 78 * 252 / 365),
+    ('15m', '15min', 26 * 252 / 365),
+    ('1h', '1h', 7 * 252 / 365),
+    ('1d', '1D', 252 / 365),
+    ('1wk', 'W-MON', 1 / 7),
+    ('1mo', 'MS', 12 / 365),
+    ('3mo', 'QS', 4 / 365),
+    ('1y', 'YS', 1 / 365),
+]
+RESOLUTION_NAMES = [name for name, _, _ in RESOLUTIONS]
+OHLC_AGGREGATION = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def range_start(range_, today):
+    """
+    Last day (YYYY-MM-DD) before a yfinance-style range ('5d', '6mo', '1y', 'ytd', 'max', ...)
+    that ends today; None for 'max'. ValueError for a range it doesn't know.
+    """
+    start = period_start(pd.Timestamp(today), range_)
+    return None if start is None else start.strftime('%Y-%m-%d')
+
+
+def range_days(range_, today):
+    """Calendar days the range covers up to today; None for 'max'"""
+    start = range_start(range_, today)
+    return None if start is None else (pd.Timestamp(today) - pd.Timestamp(start)).days
+
+
+def coarsest(*resolutions):
+    return max(resolutions, key=RESOLUTION_NAMES.index)
+
+
+def choose_resolution(span_days, max_points, finest=SOURCE_RESOLUTION):
+    """Finest resolution, no finer than the source bars, whose bar count over span_days fits max_points"""
+    candidates = RESOLUTIONS[RESOLUTION_NAMES.index(finest):]
+    for name, _, per_day in candidates:
+        if math.ceil(span_days * per_day) + 1 <= max_points:
+            return name
+    return candidates[-1][0]
+
+
+def resample_ohlc(bars, resolution):
+    """Aggregate an OHLCV frame (DatetimeIndex) into bars of the given resolution, dropping empty bins"""
+    rule = RESOLUTIONS[RESOLUTION_NAMES.index(resolution)][1]
+    frame = bars[list(OHLC_AGGREGATION)]
+    if resolution != '1d' or frame.index.normalize().has_duplicates:
+        frame = frame.resample(rule, closed='left', label='left').agg(OHLC_AGGREGATION)
+    return frame.dropna(subset=['Close'])
+
+
+def lttb(x, y, threshold):
+    """
+    Indices of the points Largest-Triangle-Three-Buckets keeps from a line of len(y) points:
+    the first and last, plus from each of threshold - 2 equal buckets the point forming the
+    largest triangle with the previously kept point and the next bucket's average, so peaks
+    and troughs survive the thinning.
+    """
+    n = len(y)
+    if threshold >= n or n <= 2:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1])[:max(threshold, 1)]
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)  # bucket b is [edges[b], edges[b + 1])
+    starts = edges[:-1]
+    # Averages of every bucket at once; the "next bucket" of the last one is the final point
+    sizes = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[:-1], starts) / sizes, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], starts) / sizes, y[-1])
+
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - mean_x[b + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[b + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def _labels(index, resolution):
+    """Bar times as strings: dates for daily and coarser bars, ISO timestamps for intraday ones"""
+    if RESOLUTION_NAMES.index(resolution) >= RESOLUTION_NAMES.index('1d'):
+        return index.strftime('%Y-%m-%d').tolist()
+    return [t.isoformat() for t in index]
+
+
+def _rounded(values, digits=4):
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), np.round(values, digits), None).tolist()
+
+
+def candles(bars, resolution):
+    """Columnar OHLCV payload for bars already at the wanted resolution"""
+    return {
+        "resolution": resolution,
+        "points": len(bars),
+        "dates": _labels(bars.index, resolution),
+        "open": _rounded(bars['Open']),
+        "high": _rounded(bars['High']),
+        "low": _rounded(bars['Low']),
+        "close": _rounded(bars['Close']),
+        "volume": bars['Volume'].fillna(0).astype('int64').tolist()
+    }
+
+
+def line(dates, values, max_points, digits=4):
+    """Columnar line payload, LTTB-thinned to at most max_points points"""
+    values = np.asarray(values, dtype=float)
+    keep = lttb(np.arange(len(values)), values, max_points)
+    return {
+        "points": len(keep),
+        "source_points": len(values),
+        "dates": [dates[i] for i in keep],
+        "values": _rounded(values[keep], digits)
+    }
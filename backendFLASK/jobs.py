@@ -0,0 +1,205 @@
+import json
+import os
+import queue
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models import db, Job, JobLock
+
+
+def utcnow():
+    # SQLite stores naive datetimes, so keep everything naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def new_owner_id():
+    """Identifies this worker process in lock rows"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def try_acquire(name, owner, ttl):
+    """
+    Take the named lock if nobody holds it or the holder's lease has expired.
+    Done in one INSERT ... ON CONFLICT so two workers can never both win.
+    """
+    now = utcnow()
+    stmt = insert(JobLock.__table__).values(
+        name=name, owner=owner, status='running', done=0, total=0, message=None,
+        expires_at=now + timedelta(seconds=ttl), updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['name'],
+        set_={
+            'owner': stmt.excluded.owner,
+            'status': stmt.excluded.status,
+            'done': 0,
+            'total': 0,
+            'message': None,
+            'expires_at': stmt.excluded.expires_at,
+            'updated_at': stmt.excluded.updated_at
+        },
+        where=JobLock.__table__.c.expires_at < now
+    )
+    db.session.execute(stmt)
+    db.session.commit()
+
+    lock = db.session.get(JobLock, name)
+    return lock is not None and lock.owner == owner
+
+
+def report_progress(name, owner, done, total, ttl, message=None):
+    """Record progress and extend the lease so a long job isn't taken over mid-run"""
+    now = utcnow()
+    JobLock.query.filter_by(name=name, owner=owner).update({
+        'done': done,
+        'total': total,
+        'message': message,
+        'expires_at': now + timedelta(seconds=ttl),
+        'updated_at': now
+    })
+    db.session.commit()
+
+
+def finish(name, owner, status, hold=0, message=None):
+    """
+    Mark the job finished. The lock is kept for `hold` seconds so other workers
+    starting within that window don't repeat the job; hold=0 lets the next one retry right away.
+    """
+    now = utcnow()
+    JobLock.query.filter_by(name=name, owner=owner).update({
+        'status': status,
+        'message': message,
+        'expires_at': now + timedelta(seconds=hold),
+        'updated_at': now
+    })
+    db.session.commit()
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once its job has been cancelled"""
+
+
+def update_job(job, done, total, message=None):
+    """
+    Record a running job's progress. Raises JobCancelled when a cancel was requested,
+    from this worker or any other, so long handlers stop at their next checkpoint.
+    """
+    job.done = done
+    job.total = total
+    job.message = message
+    db.session.commit()
+    if db.session.query(Job.cancel_requested).filter(Job.id == job.id).scalar():
+        raise JobCancelled()
+
+
+def cancel_job(job):
+    """
+    Cancel a job: a queued one never starts, a running one stops at its next update_job call.
+    Returns False when the job has already finished.
+    """
+    if job.status not in ('queued', 'running'):
+        return False
+    job.cancel_requested = True
+    if job.status == 'queued':
+        job.status = 'cancelled'
+        job.finished_at = utcnow()
+    db.session.commit()
+    return True
+
+
+def get_status(name):
+    lock = db.session.get(JobLock, name)
+    return lock.to_dict() if lock else None
+
+
+class JobRunner:
+    """
+    Runs queued jobs one at a time on a background thread of this worker.
+    Job rows hold the status, so /api/jobs/<id> answers from any worker, and a kind that is
+    already queued or running anywhere is not queued twice (unless submitted with single=False).
+    """
+
+    def __init__(self, app, stale_after=600):
+        self.app = app
+        self.stale_after = stale_after
+        self.handlers = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, kind, handler):
+        """
+        handler(job) runs inside an app context and returns a JSON-serializable result.
+        It reads its input from job.params and may report progress (and notice cancellation) with update_job
+        """
+        self.handlers[kind] = handler
+
+    def submit(self, kind, params=None, single=True):
+        """
+        Queue a job of this kind, or with single=True return the one already in flight.
+        params (JSON-serializable) are stored on the job for its handler. Returns (job, created)
+        """
+        if single:
+            active = Job.query.filter(Job.kind == kind, Job.status.in_(['queued', 'running'])) \
+                .order_by(Job.id.desc()).first()
+            if active and utcnow() - (active.started_at or active.created_at) < timedelta(seconds=self.stale_after):
+                return active, False
+            if active:
+                # Its worker died without finishing it
+                active.status = 'failed'
+                active.message = 'Abandoned by its worker'
+                active.finished_at = utcnow()
+
+        job = Job(kind=kind, status='queued', params=json.dumps(params) if params is not None else None,
+                  created_at=utcnow())
+        db.session.add(job)
+        db.session.commit()
+
+        self._queue.put(job.id)
+        self._ensure_thread()
+        return job, True
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='job-runner', daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self.app.app_context():
+                self._run(job_id)
+            self._queue.task_done()
+
+    def _run(self, job_id):
+        job = db.session.get(Job, job_id)
+        if job is None or job.status != 'queued':
+            return
+        job.status = 'running'
+        job.started_at = utcnow()
+        db.session.commit()
+
+        try:
+            result = self.handlers[job.kind](job)
+            job.result = json.dumps(result)
+            job.status = 'done'
+        except JobCancelled:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'cancelled'
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.status = 'failed'
+            job.message = str(e)[:200]
+        job.finished_at = utcnow()
+        db.session.commit()
+
+    def wait(self):
+        """Block until every queued job has run (used by scripts and benchmarks)"""
+        self._queue.join()
@@ -0,0 +1,167 @@
+from collections import defaultdict, deque
+
+from sqlalchemy import func
+
+from cache import account_key, bump_version
+from models import db, Transactions, TaxLot, LotSale
+
+
+def _consume(lots, quantity):
+    """Take shares from the front of a deque of open lots (FIFO), yielding (lot, shares taken)"""
+    while quantity > 0 and lots:
+        lot = lots[0]
+        taken = min(lot.remaining, quantity)
+        lot.remaining -= taken
+        quantity -= taken
+        if lot.remaining == 0:
+            lots.popleft()
+        yield lot, taken
+
+
+def _new_lot(transaction):
+    return TaxLot(
+        account_id=transaction.account_id,
+        transaction_id=transaction.id,
+        symbol=transaction.symbol,
+        date=transaction.date,
+        price=transaction.purchase_price,
+        quantity=transaction.quantity,
+        remaining=transaction.quantity
+    )
+
+
+def _new_sale(transaction, lot, taken):
+    return LotSale(
+        account_id=transaction.account_id,
+        sell_transaction_id=transaction.id,
+        lot_id=lot.id,
+        symbol=transaction.symbol,
+        date=transaction.date,
+        quantity=taken,
+        buy_price=lot.price,
+        sell_price=transaction.purchase_price,
+        realized_pnl=(transaction.purchase_price - lot.price) * taken
+    )
+
+
+def record_buy(transaction):
+    """Open a tax lot for a BUY transaction (the transaction must be flushed so it has an id)"""
+    lot = _new_lot(transaction)
+    db.session.add(lot)
+    return lot
+
+
+def record_sell(transaction):
+    """
+    Close the account's oldest open lots of the symbol for a SELL transaction and record the
+    realized P&L per lot. Returns the realized P&L of the sale.
+    """
+    open_lots = deque(
+        TaxLot.query.filter(TaxLot.account_id == transaction.account_id, TaxLot.symbol == transaction.symbol,
+                            TaxLot.remaining > 0)
+        .order_by(TaxLot.date, TaxLot.id).with_for_update().all()
+    )
+    realized = 0.0
+    for lot, taken in _consume(open_lots, transaction.quantity):
+        sale = _new_sale(transaction, lot, taken)
+        db.session.add(sale)
+        realized += sale.realized_pnl
+    return realized
+
+
+def replay(transactions):
+    """
+    Rebuild the ledger in memory from transactions in (date, id) order, each account's lots separate.
+    Returns the lots and a list of (lot, sale) pairs; nothing is added to the session.
+    """
+    open_lots = defaultdict(deque)
+    lots = []
+    sales = []
+    for t in transactions:
+        if t.type == 'BUY':
+            lot = _new_lot(t)
+            open_lots[t.account_id, t.symbol].append(lot)
+            lots.append(lot)
+        elif t.type == 'SELL':
+            for lot, taken in _consume(open_lots[t.account_id, t.symbol], t.quantity):
+                sales.append((lot, _new_sale(t, lot, taken)))
+    return lots, sales
+
+
+def _all_transactions():
+    return Transactions.query.order_by(Transactions.date, Transactions.id).all()
+
+
+def rebuild_ledger():
+    """Replace the stored lots and sales with a full replay of the transaction history (caller commits)"""
+    LotSale.query.delete()
+    TaxLot.query.delete()
+
+    transactions = _all_transactions()
+    lots, sales = replay(transactions)
+    db.session.add_all(lots)
+    db.session.flush()
+    for lot, sale in sales:
+        sale.lot_id = lot.id
+    db.session.add_all([sale for _, sale in sales])
+    for account_id in {t.account_id for t in transactions}:
+        bump_version(account_key(account_id))
+    return len(lots), len(sales)
+
+
+def verify_ledger(tolerance=0.005):
+    """
+    Compare the stored ledger with a full replay, per account and symbol.
+    Returns a list of mismatches; an empty list means the ledger is consistent.
+    """
+    lots, sales = replay(_all_transactions())
+    expected = defaultdict(lambda: {"realized_pnl": 0.0, "open_quantity": 0})
+    for lot in lots:
+        expected[lot.account_id, lot.symbol]["open_quantity"] += lot.remaining
+    for _, sale in sales:
+        expected[sale.account_id, sale.symbol]["realized_pnl"] += sale.realized_pnl
+
+    stored = defaultdict(lambda: {"realized_pnl": 0.0, "open_quantity": 0})
+    for account_id, symbol, pnl in db.session.query(LotSale.account_id, LotSale.symbol, func.sum(LotSale.realized_pnl)) \
+            .group_by(LotSale.account_id, LotSale.symbol):
+        stored[account_id, symbol]["realized_pnl"] = pnl or 0.0
+    for account_id, symbol, qty in db.session.query(TaxLot.account_id, TaxLot.symbol, func.sum(TaxLot.remaining)) \
+            .group_by(TaxLot.account_id, TaxLot.symbol):
+        stored[account_id, symbol]["open_quantity"] = qty or 0
+
+    mismatches = []
+    for account_id, symbol in sorted(set(expected) | set(stored)):
+        e, s = expected[account_id, symbol], stored[account_id, symbol]
+        if abs(e["realized_pnl"] - s["realized_pnl"]) > tolerance or e["open_quantity"] != s["open_quantity"]:
+            mismatches.append({"account_id": account_id, "symbol": symbol, "expected": dict(e), "stored": dict(s)})
+    return mismatches
+
+
+def realized_pnl_summary(account_id, symbol=None, start=None, end=None, group_by=None):
+    """
+    Realized P&L of one account as SUM queries over its lot sales.
+    start/end are datetimes (end exclusive); group_by is None, 'symbol' or 'date'.
+    """
+    def filtered(query):
+        query = query.filter(LotSale.account_id == account_id)
+        if symbol:
+            query = query.filter(LotSale.symbol == symbol)
+        if start:
+            query = query.filter(LotSale.date >= start)
+        if end:
+            query = query.filter(LotSale.date < end)
+        return query
+
+    total = filtered(db.session.query(func.sum(LotSale.realized_pnl))).scalar() or 0.0
+    result = {"total_realized_pnl": round(total, 2)}
+
+    if group_by == 'symbol':
+        rows = filtered(db.session.query(LotSale.symbol, func.sum(LotSale.realized_pnl))) \
+            .group_by(LotSale.symbol).order_by(LotSale.symbol).all()
+        result["by_symbol"] = [{"symbol": s, "realized_pnl": round(p, 2)} for s, p in rows]
+    elif group_by == 'date':
+        day = func.date(LotSale.date)
+        rows = filtered(db.session.query(day, func.sum(LotSale.realized_pnl))) \
+            .group_by(day).order_by(day).all()
+        result["by_date"] = [{"date": d, "realized_pnl": round(p, 2)} for d, p in rows]
+    return result
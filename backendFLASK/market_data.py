@@ -0,0 +1,238 @@
+import asyncio
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from curl_cffi import requests as curl_requests
+
+PERIOD_OFFSETS = {
+    'd': pd.offsets.BDay,
+    'wk': lambda n: pd.DateOffset(weeks=n),
+    'mo': lambda n: pd.DateOffset(months=n),
+    'y': lambda n: pd.DateOffset(years=n)
+}
+
+
+class MarketDataError(Exception):
+    """An upstream market-data call failed"""
+
+
+def period_start(end, period):
+    """
+    Last date before a yfinance-style period ('5d', '1wk', '1mo', '1y', 'ytd', 'max') that ends at end;
+    rows after it are in the period. None for 'max'. Day periods count trading days, like yfinance.
+    """
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(end.year, 1, 1) - pd.Timedelta(days=1)
+    for unit, offset in PERIOD_OFFSETS.items():
+        count = period[:-len(unit)]
+        if period.endswith(unit) and count.isdigit():
+            return end - offset(int(count))
+    raise ValueError(f"Unsupported period '{period}'")
+
+
+class MarketDataProvider:
+    """
+    Where quotes and price history come from. Every endpoint goes through one of these,
+    so the backend can run against Yahoo Finance or fully offline against SyntheticProvider.
+    """
+
+    def info(self, symbol):
+        """Quote info dict in yfinance's shape (currentPrice, longName, previousClose, ...)"""
+        raise NotImplementedError
+
+    # True when info_async waits on I/O without holding a thread; otherwise info() blocks a thread
+    # for the whole upstream call and async callers have to run it on a pool of their own
+    native_async = False
+
+    async def info_async(self, symbol):
+        """info() awaited without holding a thread; only providers with native_async implement it"""
+        raise NotImplementedError
+
+    def history(self, symbol, period='5d'):
+        """Daily Open/High/Low/Close/Volume frame for one symbol, indexed by Date"""
+        raise NotImplementedError
+
+    def closes(self, symbols, start=None, end=None, period='1mo'):
+        """
+        Closing prices for many symbols (dates x symbols).
+        start/end are inclusive YYYY-MM-DD strings; without them the last `period` is returned.
+        """
+        raise NotImplementedError
+
+    def last_close(self, symbol):
+        """Most recent daily close, or 0 when there is none (fallback when a quote has no price)"""
+        hist = self.history(symbol, period='1d')
+        return float(hist['Close'].iloc[-1]) if not hist.empty else 0.0
+
+
+class YFinanceProvider(MarketDataProvider):
+    """
+    Live data from Yahoo Finance, every call over one shared HTTP session.
+    yfinance only has blocking calls, so this provider has no info_async.
+    """
+
+    def __init__(self, session=None):
+        # One session keeps connections and Yahoo's cookie/crumb alive between calls
+        # (curl handles are per thread, the connection cache and cookies are shared)
+        self.session = session or curl_requests.Session(impersonate='chrome')
+
+    def info(self, symbol):
+        return yf.Ticker(symbol, session=self.session).info
+
+    def history(self, symbol, period='5d'):
+        return yf.Ticker(symbol, session=self.session).history(period=period)
+
+    def closes(self, symbols, start=None, end=None, period='1mo'):
+        if start:
+            # yfinance treats end as exclusive
+            end_exclusive = (datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d') if end else None
+            return yf.download(symbols, start=start, end=end_exclusive, progress=False, session=self.session)['Close']
+        return yf.download(symbols, period=period, progress=False, session=self.session)['Close']
+
+
+class SyntheticProvider(MarketDataProvider):
+    """
+    Deterministic offline market: every symbol gets a geometric Brownian motion price path over
+    business days from `origin`, seeded by (seed, symbol), so the same seed always yields the same
+    prices in any process. latency (plus up to `jitter`) seconds is slept on every call and
+    `error_rate` of calls raise MarketDataError, to stand in for a slow or flaky upstream.
+    """
+
+    def __init__(self, seed=0, latency=0.0, jitter=0.0, error_rate=0.0, drift=0.07, volatility=0.3,
+                 origin='2015-01-02'):
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drift = drift
+        self.volatility = volatility
+        self.origin = origin
+        self.calls = 0
+        self.errors = 0
+        self._paths = {}  # symbol: OHLCV frame from origin through today
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw_call(self):
+        """Injected (delay, failure) for one provider call"""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def _upstream_call(self):
+        """Injected latency and failures, applied once per provider call"""
+        delay, fail = self._draw_call()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise MarketDataError("Injected market data failure")
+
+    async def _upstream_call_async(self):
+        # The same latency awaited instead of slept, like a non-blocking HTTP client
+        delay, fail = self._draw_call()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise MarketDataError("Injected market data failure")
+
+    def _path(self, symbol):
+        symbol = symbol.upper()
+        today = pd.Timestamp(datetime.now(timezone.utc).date())
+        with self._lock:
+            path = self._paths.get(symbol)
+        # Paths are extended once a day; the same seed regenerates the same prices
+        if path is not None and path.attrs['today'] == today:
+            return path
+
+        days = np.arange(np.datetime64(self.origin), np.datetime64(today.date()) + 1)
+        # Weekdays only (bdate_range generates them one by one, which dominates for many symbols)
+        dates = pd.DatetimeIndex(days[np.is_busday(days)], name='Date')
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        days = len(dates)
+        mu, sigma = self.drift / 252, self.volatility / np.sqrt(252)
+        start_price = rng.uniform(20, 500)
+        close = start_price * np.exp(np.cumsum(rng.normal(mu - sigma ** 2 / 2, sigma, days)))
+        open_ = np.concatenate([[start_price], close[:-1]]) * np.exp(rng.normal(0, sigma / 4, days))
+        spread = np.abs(rng.normal(0, sigma / 2, days))
+        path = pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) * (1 + spread),
+            'Low': np.minimum(open_, close) * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(100_000, 10_000_000, days)
+        }, index=dates)
+        path.attrs['today'] = today
+        with self._lock:
+            self._paths[symbol] = path
+        return path
+
+    def info(self, symbol):
+        self._upstream_call()
+        return self._quote(symbol)
+
+    native_async = True
+
+    async def info_async(self, symbol):
+        await self._upstream_call_async()
+        return self._quote(symbol)
+
+    def _quote(self, symbol):
+        symbol = symbol.upper()
+        path = self._path(symbol)
+        last, previous = path.iloc[-1], path.iloc[-2]
+        return {
+            'symbol': symbol,
+            'shortName': symbol,
+            'longName': f"{symbol} Synthetic Inc.",
+            'currency': 'USD',
+            'currentPrice': round(float(last['Close']), 2),
+            'regularMarketPrice': round(float(last['Close']), 2),
+            'previousClose': round(float(previous['Close']), 2),
+            'volume': int(last['Volume']),
+            'industry': 'Simulation',
+            'sector': 'Synthetic',
+            'beta': 1.0,
+            'longBusinessSummary': 'Simulated security for offline runs.',
+            'dividendYield': 0,
+            'trailingPE': 0,
+            'trailingEps': 0
+        }
+
+    def history(self, symbol, period='5d'):
+        self._upstream_call()
+        path = self._path(symbol)
+        start = period_start(path.index[-1], period)
+        return path if start is None else path.loc[path.index > start]
+
+    def closes(self, symbols, start=None, end=None, period='1mo'):
+        self._upstream_call()
+        frame = pd.DataFrame({symbol.upper(): self._path(symbol)['Close'] for symbol in symbols})
+        if start:
+            return frame.loc[start:end] if end else frame.loc[start:]
+        first = period_start(frame.index[-1], period)
+        return frame if first is None else frame.loc[frame.index > first]
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'synthetic': SyntheticProvider
+}
+
+
+def create_provider(name, **options):
+    """Build a provider by name ('yfinance' or 'synthetic') with its keyword options"""
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown market data provider '{name}', expected one of {', '.join(PROVIDERS)}")
+    return PROVIDERS[name](**options)
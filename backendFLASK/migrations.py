@@ -0,0 +1,128 @@
+"""
+Versioned schema migrations for existing stocks.db files.
+
+db.create_all() only creates missing tables, so anything added to an existing table
+(indexes, constraints) goes here. The applied version is kept in SQLite's PRAGMA user_version.
+Every step must be safe to run on a fresh database that create_all() already built.
+"""
+from sqlalchemy import text
+
+from models import db, DEFAULT_ACCOUNT_ID, LotSale, PortfolioSnapshot, Stock, TaxLot, Transactions
+from ledger import rebuild_ledger
+
+
+def _portfolio_unique_symbol_date():
+    # Collapse duplicate closes, keeping the earliest row, before adding the unique index
+    db.session.execute(text(
+        "DELETE FROM portfolio WHERE id NOT IN "
+        "(SELECT MIN(id) FROM portfolio GROUP BY symbol, date)"
+    ))
+    db.session.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_portfolio_symbol_date ON portfolio (symbol, date)"
+    ))
+
+
+def _hot_lookup_indexes():
+    # Merge duplicate holdings of one symbol into the earliest row (weighted average price)
+    duplicates = db.session.execute(text(
+        "SELECT symbol, MIN(id), SUM(quantity), SUM(quantity * purchase_price) "
+        "FROM stock GROUP BY symbol HAVING COUNT(*) > 1"
+    )).all()
+    for symbol, keep_id, quantity, cost in duplicates:
+        db.session.execute(text(
+            "UPDATE stock SET quantity = :quantity, purchase_price = :price WHERE id = :id"
+        ), {"quantity": quantity, "price": cost / quantity if quantity else 0, "id": keep_id})
+        db.session.execute(text(
+            "DELETE FROM stock WHERE symbol = :symbol AND id != :id"
+        ), {"symbol": symbol, "id": keep_id})
+
+    db.session.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_stock_symbol ON stock (symbol)"))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_symbol_date ON transactions (symbol, date)"
+    ))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_date_id ON transactions (date, id)"
+    ))
+
+
+def _build_lot_ledger():
+    # Seed the tax-lot ledger from the existing transaction history (lots are per account)
+    _account_columns()
+    if not TaxLot.query.first():
+        rebuild_ledger()
+
+
+def _seed_price_coverage():
+    # Treat the closes already stored as covered so the first refresh only fetches what's missing
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO price_coverage (symbol, start, \"end\") "
+        "SELECT symbol, MIN(date), MAX(date) FROM portfolio GROUP BY symbol"
+    ))
+
+
+def _columns(table):
+    return {row[1] for row in db.session.execute(text(f"PRAGMA table_info({table})"))}
+
+
+def _account_columns():
+    # Everything recorded before accounts existed belongs to the single original account
+    if 'starting_balance' not in _columns('account'):
+        db.session.execute(text("ALTER TABLE account ADD COLUMN starting_balance FLOAT NOT NULL DEFAULT 100000.0"))
+    for table in ('stock', 'transactions', 'tax_lot', 'lot_sale'):
+        if 'account_id' not in _columns(table):
+            db.session.execute(text(
+                f"ALTER TABLE {table} ADD COLUMN account_id INTEGER NOT NULL DEFAULT {DEFAULT_ACCOUNT_ID}"
+            ))
+
+
+def _per_account_indexes():
+    _account_columns()
+    # Replaced by the same indexes with account_id in front
+    for name in ('uq_stock_symbol', 'ix_transactions_date_id', 'ix_tax_lot_symbol_date',
+                 'ix_lot_sale_symbol_date', 'ix_lot_sale_date'):
+        db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    connection = db.session.connection()
+    for model in (Stock, Transactions, TaxLot, LotSale):
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+    # Snapshots are derived data: rebuild the table keyed on (account_id, date) and let them be recomputed
+    if 'account_id' not in _columns('portfolio_snapshot'):
+        db.session.execute(text("DROP TABLE portfolio_snapshot"))
+        PortfolioSnapshot.__table__.create(connection)
+
+
+def _job_params_and_cancel():
+    if 'params' not in _columns('job'):
+        db.session.execute(text("ALTER TABLE job ADD COLUMN params TEXT"))
+    if 'cancel_requested' not in _columns('job'):
+        db.session.execute(text("ALTER TABLE job ADD COLUMN cancel_requested BOOLEAN NOT NULL DEFAULT 0"))
+
+
+# (version, description, step) in the order they are applied
+MIGRATIONS = [
+    (1, "unique Portfolio(symbol, date)", _portfolio_unique_symbol_date),
+    (2, "indexes on Stock.symbol and Transactions(symbol, date), (date, id)", _hot_lookup_indexes),
+    (3, "FIFO tax-lot ledger", _build_lot_ledger),
+    (4, "price coverage per symbol", _seed_price_coverage),
+    (5, "account_id on holdings, transactions, lots and snapshots, indexed first", _per_account_indexes),
+    (6, "job params and cancellation", _job_params_and_cancel),
+]
+
+
+def schema_version():
+    return db.session.execute(text("PRAGMA user_version")).scalar()
+
+
+def run_migrations():
+    """Apply every migration newer than the database's user_version, each in its own transaction"""
+    current = schema_version()
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        step()
+        db.session.execute(text(f"PRAGMA user_version = {int(version)}"))
+        db.session.commit()
+        applied.append(description)
+    return applied
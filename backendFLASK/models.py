@@ -1,20 +1,31 @@
+import json
+
 from flask_sqlalchemy import SQLAlchemy
 
 
 db = SQLAlchemy()
 
+DEFAULT_ACCOUNT_ID = 1  # the account requests act on when they don't name one
+DEFAULT_STARTING_BALANCE = 100000.0
+
 class Account(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    balance = db.Column(db.Float, nullable=False, default=100000.0)
+    balance = db.Column(db.Float, nullable=False, default=DEFAULT_STARTING_BALANCE)
+    # Cash the account opened with; portfolio value history starts from it
+    starting_balance = db.Column(db.Float, nullable=False, default=DEFAULT_STARTING_BALANCE)
     
     def to_dict(self):
         return {
             "id": self.id,
-            "balance": self.balance
+            "balance": self.balance,
+            "starting_balance": self.starting_balance
         }
 
 class Stock(db.Model):
+    __table_args__ = (db.Index('uq_stock_account_symbol', 'account_id', 'symbol', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     symbol = db.Column(db.String(10), nullable=False)
     name = db.Column(db.String(50), nullable=True)
     purchase_price = db.Column(db.Float, nullable=False)
@@ -30,6 +41,9 @@ class Stock(db.Model):
         }
 
 class Portfolio(db.Model):
+    """Daily closing prices, shared by every account"""
+    __table_args__ = (db.Index('uq_portfolio_symbol_date', 'symbol', 'date', unique=True),)
+
     id = db.Column(db.Integer, primary_key=True)
     symbol = db.Column(db.String(10), nullable=False)
     date = db.Column(db.String(10), nullable=False)
@@ -44,7 +58,15 @@ class Portfolio(db.Model):
         }
     
 class Transactions(db.Model):
+    __table_args__ = (
+        db.Index('ix_transactions_account_date_id', 'account_id', 'date', 'id'),
+        db.Index('ix_transactions_account_symbol_date', 'account_id', 'symbol', 'date'),
+        # Across accounts: which symbols need shared price history, and from when
+        db.Index('ix_transactions_symbol_date', 'symbol', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
     symbol = db.Column(db.String(10), nullable=False)
     date = db.Column(db.DateTime, nullable=False)
     type = db.Column(db.String(4), nullable=False)
@@ -61,4 +83,151 @@ class Transactions(db.Model):
             "quantity": self.quantity,
             "purchase_price": self.purchase_price,
             "total_amount": self.total_amount
-        }
\ No newline at end of file
+        }
+
+class PortfolioSnapshot(db.Model):
+    """Persisted end-of-day portfolio value so /api/portfolio/value only computes new days"""
+    __table_args__ = (db.Index('uq_portfolio_snapshot_account_date', 'account_id', 'date', unique=True),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    date = db.Column(db.String(10), nullable=False)
+    cash = db.Column(db.Float, nullable=False)
+    holdings_value = db.Column(db.Float, nullable=False)
+    total_value = db.Column(db.Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            "date": self.date,
+            "cash": self.cash,
+            "holdings_value": self.holdings_value,
+            "total_value": self.total_value
+        }
+
+class JobLock(db.Model):
+    """Lock row that single-flights a background job across worker processes and records its progress"""
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(64), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='idle')
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(200), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "owner": self.owner,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "message": self.message,
+            "expires_at": self.expires_at.isoformat() if self.expires_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class TaxLot(db.Model):
+    """One BUY transaction's shares, consumed first-in first-out by later sells"""
+    __table_args__ = (db.Index('ix_tax_lot_account_symbol_date', 'account_id', 'symbol', 'date', 'id'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False)
+    symbol = db.Column(db.String(10), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    remaining = db.Column(db.Integer, nullable=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "transaction_id": self.transaction_id,
+            "symbol": self.symbol,
+            "date": self.date.isoformat() if self.date else None,
+            "price": self.price,
+            "quantity": self.quantity,
+            "remaining": self.remaining
+        }
+
+class LotSale(db.Model):
+    """Shares of one tax lot closed by a SELL, with the realized P&L recorded at sell time"""
+    __table_args__ = (
+        db.Index('ix_lot_sale_account_symbol_date', 'account_id', 'symbol', 'date'),
+        db.Index('ix_lot_sale_account_date', 'account_id', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('account.id'), nullable=False)
+    sell_transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id'), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey('tax_lot.id'), nullable=False)
+    symbol = db.Column(db.String(10), nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    buy_price = db.Column(db.Float, nullable=False)
+    sell_price = db.Column(db.Float, nullable=False)
+    realized_pnl = db.Column(db.Float, nullable=False)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "sell_transaction_id": self.sell_transaction_id,
+            "lot_id": self.lot_id,
+            "symbol": self.symbol,
+            "date": self.date.isoformat() if self.date else None,
+            "quantity": self.quantity,
+            "buy_price": self.buy_price,
+            "sell_price": self.sell_price,
+            "realized_pnl": self.realized_pnl
+        }
+
+class PriceCoverage(db.Model):
+    """Date range of closes already downloaded for a symbol, so refreshes only fetch the gaps"""
+    symbol = db.Column(db.String(10), primary_key=True)
+    start = db.Column(db.String(10), nullable=False)
+    end = db.Column(db.String(10), nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "symbol": self.symbol,
+            "start": self.start,
+            "end": self.end,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class DataVersion(db.Model):
+    """Counter bumped in the same transaction as every write that changes derived portfolio data"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    """A queued background job; its status is in the database so every worker can report it"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.String(200), nullable=True)
+    params = db.Column(db.Text, nullable=True)  # JSON input for the handler, e.g. a backtest request
+    result = db.Column(db.Text, nullable=True)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "message": self.message,
+            "result": json.loads(self.result) if self.result else None,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
@@ -0,0 +1,191 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import aliased
+
+from models import db, Account, Portfolio, Transactions, PortfolioSnapshot
+
+
+def _signed_quantity():
+    """SQL expression for a transaction's effect on the share count (+ for BUY, - for SELL)"""
+    return case((Transactions.type == 'BUY', Transactions.quantity), else_=-Transactions.quantity)
+
+
+def _day_start(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+
+def starting_balance(account_id):
+    return db.session.query(Account.starting_balance).filter(Account.id == account_id).scalar() or 0.0
+
+
+def holdings_as_of(account_id, date_str):
+    """An account's share count per symbol and cash balance after every transaction up to and including date_str"""
+    end = _day_start(date_str) + timedelta(days=1)
+
+    rows = db.session.query(Transactions.symbol, func.sum(_signed_quantity())) \
+        .filter(Transactions.account_id == account_id, Transactions.date < end) \
+        .group_by(Transactions.symbol).all()
+    holdings = {symbol: qty for symbol, qty in rows if qty}
+
+    cash_delta = db.session.query(func.sum(
+        case((Transactions.type == 'BUY', -Transactions.quantity * Transactions.purchase_price),
+             else_=Transactions.quantity * Transactions.purchase_price)
+    )).filter(Transactions.account_id == account_id, Transactions.date < end).scalar() or 0.0
+
+    return holdings, starting_balance(account_id) + cash_delta
+
+
+def load_transactions(account_id, after=None):
+    """An account's transactions after the given day as a DataFrame of date, symbol, signed quantity, cash delta and price"""
+    query = db.session.query(
+        Transactions.date, Transactions.symbol, Transactions.type,
+        Transactions.quantity, Transactions.purchase_price
+    ).filter(Transactions.account_id == account_id).order_by(Transactions.date, Transactions.id)
+    if after:
+        query = query.filter(Transactions.date >= _day_start(after) + timedelta(days=1))
+
+    df = pd.DataFrame(query.all(), columns=['date', 'symbol', 'type', 'quantity', 'price'])
+    if df.empty:
+        return df
+
+    sign = df['type'].map({'BUY': 1, 'SELL': -1}).fillna(0)
+    df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+    df['signed_qty'] = sign * df['quantity']
+    df['cash_delta'] = -df['signed_qty'] * df['price']
+    return df
+
+
+def load_prices(symbols, start):
+    """
+    Closing prices for the symbols from start onward, plus each symbol's last close
+    before start so values can be carried forward into the window
+    """
+    if not symbols:
+        return pd.DataFrame(columns=['date', 'symbol', 'closing_price'])
+
+    rows = db.session.query(Portfolio.date, Portfolio.symbol, Portfolio.closing_price) \
+        .filter(Portfolio.symbol.in_(symbols), Portfolio.date >= start).all()
+
+    # Driven from the symbol list so each symbol costs one index seek for its MAX(date);
+    # a GROUP BY MAX() over the IN list would scan every older close instead
+    wanted = func.json_each(json.dumps(list(symbols))).table_valued('value')
+    earlier = aliased(Portfolio)
+    latest_before = select(func.max(earlier.date)) \
+        .where(earlier.symbol == wanted.c.value, earlier.date < start).scalar_subquery()
+    seed = db.session.query(Portfolio.date, Portfolio.symbol, Portfolio.closing_price) \
+        .join(wanted, Portfolio.symbol == wanted.c.value) \
+        .filter(Portfolio.date == latest_before).all()
+
+    return pd.DataFrame(seed + rows, columns=['date', 'symbol', 'closing_price'])
+
+
+def build_daily_values(transactions, prices, start_holdings, start_cash, start=None):
+    """
+    Vectorized portfolio value per day.
+
+    holdings[date x symbol] = start_holdings + cumulative signed transaction quantities
+    prices[date x symbol]   = closing prices, falling back to the last trade price, forward filled
+    total[date]             = cash[date] + sum(holdings * prices)
+    """
+    dates = set(transactions['date']) if not transactions.empty else set()
+    if start is None and dates:
+        start = min(dates)
+    if start is None:
+        return pd.DataFrame(columns=['date', 'cash', 'holdings_value', 'total_value'])
+
+    dates |= {d for d in prices['date'] if d >= start}
+    dates = sorted(d for d in dates if d >= start)
+    if not dates:
+        return pd.DataFrame(columns=['date', 'cash', 'holdings_value', 'total_value'])
+
+    symbols = sorted(set(start_holdings) | set(transactions.get('symbol', [])))
+    index = pd.Index(dates, name='date')
+
+    if transactions.empty:
+        quantity_changes = pd.DataFrame(0.0, index=index, columns=symbols)
+        cash_changes = pd.Series(0.0, index=index)
+    else:
+        quantity_changes = transactions.pivot_table(index='date', columns='symbol', values='signed_qty', aggfunc='sum') \
+            .reindex(index=index, columns=symbols).fillna(0.0)
+        cash_changes = transactions.groupby('date')['cash_delta'].sum().reindex(index).fillna(0.0)
+
+    opening = pd.Series(start_holdings, dtype=float).reindex(symbols).fillna(0.0)
+    holdings = quantity_changes.cumsum() + opening
+    cash = cash_changes.cumsum() + start_cash
+
+    # Closes come first; the last trade price of the day only fills days with no close at all
+    all_dates = sorted(set(dates) | set(prices['date']))
+    if prices.empty:
+        closes = pd.DataFrame(float('nan'), index=all_dates, columns=symbols)
+    else:
+        closes = prices.pivot_table(index='date', columns='symbol', values='closing_price', aggfunc='last') \
+            .reindex(index=all_dates, columns=symbols)
+    if not transactions.empty:
+        trade_prices = transactions.pivot_table(index='date', columns='symbol', values='price', aggfunc='last') \
+            .reindex(index=all_dates, columns=symbols)
+        closes = closes.combine_first(trade_prices)
+    price_matrix = closes.ffill().reindex(index).fillna(0.0)
+
+    holdings_value = (holdings * price_matrix).sum(axis=1)
+    return pd.DataFrame({
+        'date': dates,
+        'cash': cash.values,
+        'holdings_value': holdings_value.values,
+        'total_value': (cash + holdings_value).values
+    })
+
+
+def invalidate_snapshots(from_date):
+    """Drop every account's persisted snapshots on or after from_date, e.g. after older closes were backfilled"""
+    PortfolioSnapshot.query.filter(PortfolioSnapshot.date >= from_date).delete()
+
+
+def portfolio_value_series(account_id):
+    """
+    An account's daily portfolio value from its first transaction onward.
+    Only days after the last persisted snapshot are computed; finished days are persisted.
+    """
+    snapshots = db.session.execute(
+        select(PortfolioSnapshot.date, PortfolioSnapshot.total_value)
+        .where(PortfolioSnapshot.account_id == account_id).order_by(PortfolioSnapshot.date)
+    ).all()
+    last = snapshots[-1].date if snapshots else None
+
+    if last:
+        start_holdings, start_cash = holdings_as_of(account_id, last)
+    else:
+        start_holdings, start_cash = {}, starting_balance(account_id)
+
+    transactions = load_transactions(account_id, after=last)
+    if last is None and transactions.empty:
+        return []
+
+    symbols = sorted(set(start_holdings) | set(transactions['symbol'] if not transactions.empty else []))
+    start = (_day_start(last) + timedelta(days=1)).strftime('%Y-%m-%d') if last else transactions['date'].min()
+    prices = load_prices(symbols, start)
+
+    new_days = build_daily_values(transactions, prices, start_holdings, start_cash, start=start)
+
+    # Today can still change with new trades and prices, so only persist days before it
+    today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    finished = new_days[new_days['date'] < today]
+    if not finished.empty:
+        # A concurrent request may have stored the same days already; they hold the same values
+        stmt = insert(PortfolioSnapshot.__table__).on_conflict_do_nothing(index_elements=['account_id', 'date'])
+        db.session.execute(stmt, [
+            {"account_id": account_id, "date": row.date, "cash": float(row.cash),
+             "holdings_value": float(row.holdings_value), "total_value": float(row.total_value)}
+            for row in finished.itertuples(index=False)
+        ])
+        db.session.commit()
+
+    res = [{"date": s.date, "total_value": round(s.total_value, 2)} for s in snapshots]
+    res += [
+        {"date": row.date, "total_value": round(float(row.total_value), 2)}
+        for row in new_days.itertuples(index=False)
+    ]
+    return res
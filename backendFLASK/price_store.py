@@ -0,0 +1,233 @@
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from cache import PRICES, bump_version, symbol_key
+from models import db, Portfolio, PriceCoverage, Transactions
+from performance import invalidate_snapshots
+
+# How far back prices go for a symbol with no transactions older than this
+DEFAULT_LOOKBACK_DAYS = 30
+
+
+def closes_to_rows(close_frame):
+    """
+    Turn a provider's closes(...) frame (dates x symbols) into Portfolio rows, skipping missing closes.
+    A Series is treated as a single symbol named by its name.
+    """
+    if isinstance(close_frame, pd.Series):
+        close_frame = close_frame.to_frame()
+
+    long = close_frame.stack().dropna().reset_index()
+    long.columns = ['date', 'symbol', 'closing_price']
+    long['date'] = pd.to_datetime(long['date']).dt.strftime('%Y-%m-%d')
+    long['closing_price'] = long['closing_price'].astype(float)
+    return long.to_dict(orient='records')
+
+
+def upsert_closes(close_frame, overwrite=True):
+    """
+    Write a whole downloaded close frame to the Portfolio table in one INSERT ... ON CONFLICT statement.
+    With overwrite=True existing closes are updated, otherwise they are left alone.
+    Returns the earliest date written, or None when there was nothing to write.
+    """
+    return _upsert_rows(closes_to_rows(close_frame), overwrite)
+
+
+def _upsert_rows(rows, overwrite=True):
+    if not rows:
+        return None
+
+    stmt = insert(Portfolio.__table__)
+    if overwrite:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['symbol', 'date'],
+            set_={'closing_price': stmt.excluded.closing_price}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['symbol', 'date'])
+
+    db.session.execute(stmt, rows)
+    bump_version(PRICES, *sorted({symbol_key(row['symbol']) for row in rows}))
+    return min(row['date'] for row in rows)
+
+
+def _parse(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d')
+
+
+def _shift(date_str, days):
+    return (_parse(date_str) + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def _today():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def traded_symbols():
+    """Every symbol ever traded, straight from the database (SELECT DISTINCT)"""
+    return {symbol for (symbol,) in db.session.query(Transactions.symbol).distinct()}
+
+
+def stale_symbols(extra=()):
+    """
+    Traded symbols (plus any extra ones, e.g. a benchmark) whose stored closes stop before
+    yesterday, the last final close, or that have none yet
+    """
+    yesterday = _shift(_today(), -1)
+    current = {symbol for (symbol,) in db.session.query(PriceCoverage.symbol).filter(PriceCoverage.end >= yesterday)}
+    return (traded_symbols() | set(extra)) - current
+
+
+def price_start_dates(symbols, lookback_days=DEFAULT_LOOKBACK_DAYS):
+    """
+    First date each symbol needs closes for: its earliest transaction,
+    or lookback_days ago if that is earlier (so the graph always has some history)
+    """
+    floor = _shift(_today(), -lookback_days)
+    starts = {symbol: floor for symbol in symbols}
+    rows = db.session.query(Transactions.symbol, func.min(Transactions.date)) \
+        .filter(Transactions.symbol.in_(list(starts))).group_by(Transactions.symbol).all()
+    for symbol, first_trade in rows:
+        first_day = pd.Timestamp(first_trade).strftime('%Y-%m-%d')
+        starts[symbol] = min(first_day, floor)
+    return starts
+
+
+def missing_ranges(coverage, start, end):
+    """Date ranges in [start, end] not covered yet: a head gap before and a tail gap after the coverage"""
+    if coverage is None:
+        return [(start, end)]
+    gaps = []
+    if start < coverage.start:
+        gaps.append((start, _shift(coverage.start, -1)))
+    if end > coverage.end:
+        gaps.append((max(start, _shift(coverage.end, 1)), end))
+    return gaps
+
+
+def refresh_prices(symbol_starts, download, end=None):
+    """
+    Download (with download(symbols, start=, end=), e.g. a provider's closes) only the closes that are missing for each symbol, from its start date through end
+    (default today), and record the newly covered range.
+    Symbols with the same gap share one bulk request, so a routine refresh is a single download.
+    Today is never marked covered because its close is not final yet, and neither is a range
+    the download returned no closes for (it is tried again next time and listed in errors).
+    Returns {"requests": n, "rows": n, "errors": [...]}; the caller commits.
+    """
+    end = end or _today()
+    last_final_day = min(end, _shift(_today(), -1))
+    coverage = {c.symbol: c for c in PriceCoverage.query.filter(PriceCoverage.symbol.in_(list(symbol_starts))).all()}
+
+    # Group symbols by identical gap so each distinct range is one request
+    by_gap = defaultdict(list)
+    for symbol, start in symbol_starts.items():
+        for gap in missing_ranges(coverage.get(symbol), start, end):
+            by_gap[gap].append(symbol)
+
+    summary = {"requests": 0, "rows": 0, "errors": []}
+    first_dates = []
+    for (gap_start, gap_end), symbols in sorted(by_gap.items()):
+        summary["requests"] += 1
+        try:
+            closes = download(symbols, start=gap_start, end=gap_end)
+        except Exception as e:
+            summary["errors"].append(f"{gap_start}..{gap_end} {','.join(symbols)}: {e}")
+            continue
+
+        rows = closes_to_rows(closes) if closes is not None and not closes.empty else []
+        summary["rows"] += len(rows)
+        first_date = _upsert_rows(rows)
+        if first_date:
+            first_dates.append(first_date)
+
+        covered_end = min(gap_end, last_final_day)
+        if covered_end < gap_start:
+            continue
+        # A bulk download leaves a symbol it failed on empty rather than raising, so only a
+        # symbol with closes in the range counts as covered (unless the range has no weekdays)
+        returned = {row['symbol'] for row in rows if gap_start <= row['date'] <= covered_end}
+        if len(pd.bdate_range(gap_start, covered_end)):
+            failed = [symbol for symbol in symbols if symbol not in returned]
+            if failed:
+                summary["errors"].append(f"{gap_start}..{gap_end} {','.join(failed)}: no closes returned")
+            symbols = [symbol for symbol in symbols if symbol in returned]
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        for symbol in symbols:
+            c = coverage.get(symbol)
+            if c is None:
+                c = coverage[symbol] = PriceCoverage(symbol=symbol, start=gap_start, end=covered_end)
+                db.session.add(c)
+            else:
+                c.start = min(c.start, gap_start)
+                c.end = max(c.end, covered_end)
+            c.updated_at = now
+
+    # Snapshots valued with carried-forward prices are stale once the real closes arrive
+    if first_dates:
+        invalidate_snapshots(min(first_dates))
+    return summary
+
+
+class CloseMatrix:
+    """
+    In-memory dates x symbols matrix of stored closes, so analytics don't re-read the whole
+    Portfolio table on every call. A symbol's column is loaded the first time it is asked for;
+    after that each call only fetches rows added since the last one (id above the watermark)
+    plus the last few days, which are the only rows an upsert can overwrite in place
+    (today's live price replaced by the real close).
+    """
+
+    def __init__(self, refetch_days=7):
+        self.refetch_days = refetch_days
+        self.frame = pd.DataFrame(dtype=float)
+        self.watermark = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self, *conditions):
+        rows = db.session.execute(
+            select(Portfolio.id, Portfolio.date, Portfolio.symbol, Portfolio.closing_price).where(*conditions)
+        ).all()
+        return pd.DataFrame(rows, columns=['id', 'date', 'symbol', 'closing_price'])
+
+    def _merge(self, rows):
+        if rows.empty:
+            return
+        dates = self.frame.index.union(rows['date'].unique())
+        symbols = self.frame.columns.union(rows['symbol'].unique())
+        frame = self.frame
+        if len(dates) != len(frame.index) or len(symbols) != len(frame.columns):
+            frame = frame.reindex(index=dates, columns=symbols)
+        # Write the fetched closes in place by position; fetched values win over what was held
+        values = frame.to_numpy(dtype=float, copy=True)
+        values[frame.index.get_indexer(rows['date']), frame.columns.get_indexer(rows['symbol'])] = \
+            rows['closing_price'].to_numpy(dtype=float)
+        self.frame = pd.DataFrame(values, index=frame.index, columns=frame.columns)
+
+    def get(self, symbols, end=None):
+        """Closes for the symbols on or before end (YYYY-MM-DD), NaN where a symbol has no close"""
+        symbols = list(symbols)
+        with self._lock:
+            # Rows up to this id are read now; anything inserted meanwhile is picked up next call
+            top = db.session.query(func.max(Portfolio.id)).scalar() or 0
+            if len(self.frame.columns):
+                # New rows by primary key range (an IN list on symbol would walk every close of every symbol)
+                added = self._fetch(Portfolio.id > self.watermark, Portfolio.id <= top)
+                self._merge(added[added['symbol'].isin(self.frame.columns)])
+                if len(self.frame.index):
+                    recent = _shift(self.frame.index[-1], -self.refetch_days)
+                    self._merge(self._fetch(Portfolio.symbol.in_(list(self.frame.columns)), Portfolio.date >= recent))
+            missing = [s for s in symbols if s not in self.frame.columns]
+            if missing:
+                self._merge(self._fetch(Portfolio.symbol.in_(missing), Portfolio.id <= top))
+                # Symbols with no closes at all still get a column so they aren't fetched again
+                self.frame = self.frame.reindex(columns=self.frame.columns.union(missing))
+            self.watermark = top
+            frame = self.frame
+        if end is not None:
+            frame = frame.loc[:end]
+        return frame.reindex(columns=symbols)
@@ -0,0 +1,293 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import Response, g, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from market_data import MarketDataProvider
+
+# Seconds; shared by every histogram below
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Timings of the request being handled in this context (None outside a request, e.g. background jobs)
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    """Where one request's time went. Upstream calls can come from a thread pool, hence the lock"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, field, seconds, count_field=None):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + seconds)
+            if count_field:
+                setattr(self, count_field, getattr(self, count_field) + 1)
+
+    def server_timing(self, total):
+        """
+        Server-Timing header value. upstream adds up concurrent calls, so it can exceed total;
+        'app' is whatever is left of total (Python work in the view), floored at zero
+        """
+        other = max(0.0, total - self.db_seconds - self.upstream_seconds - self.serialize_seconds)
+        parts = [
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries"',
+            f'upstream;dur={self.upstream_seconds * 1000:.2f};desc="{self.upstream_calls} calls"',
+            f'serialize;dur={self.serialize_seconds * 1000:.2f}',
+            f'app;dur={other * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}'
+        ]
+        return ', '.join(parts)
+
+
+class Metrics:
+    """Counters and histograms kept in memory and rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.help = {}
+        self.counters = defaultdict(float)  # (name, labels): value
+        self.histograms = {}  # (name, labels): [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text):
+        self.help[name] = (kind, text)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self.counters[(name, labels)] += amount
+
+    def observe(self, name, labels, seconds):
+        with self._lock:
+            series = self.histograms.setdefault((name, labels), [0] * (len(BUCKETS) + 2))
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+        lines = []
+        with self._lock:
+            for name, (kind, text) in sorted(self.help.items()):
+                lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+                if kind == 'counter':
+                    for (n, labels), value in sorted(self.counters.items()):
+                        if n == name:
+                            lines.append(f'{name}{fmt(labels)} {value:g}')
+                    continue
+                for (n, labels), series in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(BUCKETS, series):
+                        lines.append(f'{name}_bucket{fmt(labels, [("le", bound)])} {count}')
+                    lines.append(f'{name}_bucket{fmt(labels, [("le", "+Inf")])} {series[-1]}')
+                    lines.append(f'{name}_sum{fmt(labels)} {series[-2]:.6f}')
+                    lines.append(f'{name}_count{fmt(labels)} {series[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+metrics.describe('http_request_duration_seconds', 'histogram', 'Request handling time')
+metrics.describe('http_request_db_seconds', 'histogram', 'Time spent in SQL per request')
+metrics.describe('http_request_db_queries_total', 'counter', 'SQL statements executed by requests')
+metrics.describe('http_request_upstream_seconds', 'histogram', 'Time spent waiting on market data per request')
+metrics.describe('http_response_serialize_seconds', 'histogram', 'JSON encoding time per request')
+metrics.describe('market_data_call_seconds', 'histogram', 'Market data provider call time, requests and background jobs')
+metrics.describe('market_data_calls_total', 'counter', 'Market data provider calls by outcome')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    if timings is not None and conn.info.get('query_started'):
+        timings.add('db_seconds', time.perf_counter() - conn.info['query_started'].pop(), 'db_queries')
+
+
+class InstrumentedProvider(MarketDataProvider):
+    """Wraps a provider and times every call, per request and in the global metrics"""
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def __getattr__(self, name):
+        # Provider-specific settings (e.g. a synthetic provider's error_rate) stay reachable
+        return getattr(self.provider, name)
+
+    def _record(self, method, started, outcome):
+        elapsed = time.perf_counter() - started
+        metrics.observe('market_data_call_seconds', (('method', method),), elapsed)
+        metrics.inc('market_data_calls_total', (('method', method), ('outcome', outcome)))
+        timings = _current.get()
+        if timings is not None:
+            timings.add('upstream_seconds', elapsed, 'upstream_calls')
+
+    def _timed(self, method, *args, **kwargs):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return getattr(self.provider, method)(*args, **kwargs)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self._record(method, started, outcome)
+
+    def info(self, symbol):
+        return self._timed('info', symbol)
+
+    @property
+    def native_async(self):
+        return self.provider.native_async
+
+    async def info_async(self, symbol):
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            return await self.provider.info_async(symbol)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            self._record('info_async', started, outcome)
+
+    def history(self, symbol, period='5d'):
+        return self._timed('history', symbol, period=period)
+
+    def closes(self, symbols, start=None, end=None, period='1mo'):
+        return self._timed('closes', symbols, start=start, end=end, period=period)
+
+
+def add_serialize_time(seconds):
+    """Count JSON encoding time towards the current request, if it is being timed"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add('serialize_seconds', seconds)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with the encoding time added to the current request"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        text = super().dumps(obj, **kwargs)
+        add_serialize_time(time.perf_counter() - started)
+        return text
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a helper thread and counts
+    identical stacks. folded() gives the collapsed-stack format that flamegraph.pl and
+    speedscope turn into a flamegraph.
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common()) + '\n'
+
+
+def init_profiling(app):
+    """
+    Turn on request instrumentation: SQL and market-data timings per request, Server-Timing headers,
+    Prometheus metrics at /metrics, and a sampling profiler for any request sent with ?profile=1
+    (folded stacks are written to PROFILE_DIR and named in the X-Profile header).
+    The app's market data provider must be wrapped in InstrumentedProvider for upstream timings.
+    """
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.json = TimedJSONProvider(app)
+    profile_dir = app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    @app.before_request
+    def start_request_timing():
+        g.request_timings = RequestTimings()
+        g.request_timings_token = _current.set(g.request_timings)
+        if request.args.get('profile') == '1':
+            g.profiler = SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def record_request_timing(response):
+        timings = g.pop('request_timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.started
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        labels = (('endpoint', endpoint), ('method', request.method))
+        metrics.observe('http_request_duration_seconds', labels + (('status', response.status_code),), total)
+        metrics.observe('http_request_db_seconds', labels, timings.db_seconds)
+        metrics.inc('http_request_db_queries_total', labels, timings.db_queries)
+        metrics.observe('http_request_upstream_seconds', labels, timings.upstream_seconds)
+        metrics.observe('http_response_serialize_seconds', labels, timings.serialize_seconds)
+        response.headers['Server-Timing'] = timings.server_timing(total)
+
+        profiler = g.pop('profiler', None)
+        if profiler:
+            profiler.stop()
+            os.makedirs(profile_dir, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{endpoint.strip('/').replace('/', '_')}.folded"
+            path = os.path.join(profile_dir, name)
+            with open(path, 'w') as f:
+                f.write(profiler.folded())
+            response.headers['X-Profile'] = path
+        return response
+
+    @app.teardown_request
+    def clear_request_timing(exc):
+        token = g.pop('request_timings_token', None)
+        if token is not None:
+            _current.reset(token)
+        profiler = g.pop('profiler', None)
+        if profiler:
+            profiler.stop()
+
+    @app.route('/metrics')
+    def prometheus_metrics():
+        """Request and market-data metrics in the Prometheus text exposition format"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
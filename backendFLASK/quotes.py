@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class FakeQuoteSource:
+    """
+    Offline quote source for tests and local development.
+    Returns canned info dicts and counts how many times each symbol was fetched.
+    """
+
+    def __init__(self, quotes=None):
+        self.quotes = {s.upper(): dict(info) for s, info in (quotes or {}).items()}
+        self.calls = 0
+
+    def set_price(self, symbol, price):
+        symbol = symbol.upper()
+        info = self.quotes.setdefault(symbol, {"symbol": symbol, "longName": symbol})
+        info["currentPrice"] = price
+
+    def __call__(self, symbol):
+        self.calls += 1
+        return dict(self.quotes.get(symbol.upper(), {}))
+
+
+class QuoteCache:
+    """
+    In-process quote cache with a TTL and LRU eviction in front of source(symbol) -> info dict
+    (a market data provider's info). Every lookup of a symbol inside the TTL is served from memory
+    instead of going upstream.
+    """
+
+    def __init__(self, source, ttl=60, max_symbols=500, clock=time.monotonic, source_async=None, max_concurrent=16):
+        self.source = source
+        # Awaitable source(symbol) that holds no thread while it waits (a provider's info_async when it
+        # has native_async); without one, async callers run the blocking source on a pool of max_concurrent threads
+        self.source_async = source_async
+        self.ttl = ttl
+        self.max_symbols = max_symbols
+        self.max_concurrent = max_concurrent
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # symbol: (fetched_at, info)
+        self._lock = threading.Lock()
+        self._in_flight = {}  # symbol: task fetching it, shared by every async caller (event loop thread only)
+        self._limit = None  # semaphore of the event loop, created on first use
+        self._executor = None  # threads blocking fetches run on for async callers, created on first use
+
+    def get_info(self, symbol):
+        """Return the info dict for a symbol, fetching it upstream only when missing or expired"""
+        symbol = symbol.upper()
+        info = self._cached(symbol)
+        if info is not None:
+            return info
+
+        # Fetch outside the lock so one slow symbol doesn't block the others
+        info = self.source(symbol) or {}
+        self._store(symbol, info)
+        return info
+
+    def _cached(self, symbol):
+        """Fresh cached info for a symbol, or None; counts the hit or miss"""
+        with self._lock:
+            entry = self._entries.get(symbol)
+            if entry and self.clock() - entry[0] < self.ttl:
+                self._entries.move_to_end(symbol)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _store(self, symbol, info):
+        with self._lock:
+            self._entries[symbol] = (self.clock(), info)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_symbols:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_info_async(self, symbol):
+        """
+        get_info for async callers: the caller awaits the upstream fetch instead of blocking on it.
+        With source_async nothing else blocks either; a blocking source holds one of this cache's
+        max_concurrent fetch threads for the call. Concurrent lookups of one symbol share a
+        single in-flight fetch, and at most max_concurrent fetches are upstream at once.
+        """
+        symbol = symbol.upper()
+        info = self._cached(symbol)
+        if info is not None:
+            return info
+
+        task = self._in_flight.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_async(symbol))
+            self._in_flight[symbol] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(symbol, None))
+        else:
+            self.coalesced += 1
+        # Shielded: a caller that goes away doesn't cancel the fetch the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _fetch_async(self, symbol):
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_concurrent)
+        async with self._limit:
+            if self.source_async is not None:
+                info = await self.source_async(symbol) or {}
+            else:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix='quote-fetch')
+                info = await asyncio.get_running_loop().run_in_executor(self._executor, self.source, symbol) or {}
+        self._store(symbol, info)
+        return info
+
+    async def get_many_async(self, symbols):
+        """get_many for async callers; a symbol whose fetch fails maps to {}"""
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        infos = await asyncio.gather(*(self.get_info_async(s) for s in symbols), return_exceptions=True)
+        return {symbol: {} if isinstance(info, BaseException) else info for symbol, info in zip(symbols, infos)}
+
+    def get_price(self, symbol):
+        """Return the current market price for a symbol, or 0 if the quote has none"""
+        info = self.get_info(symbol)
+        return info.get('currentPrice', info.get('regularMarketPrice', 0)) or 0
+
+    def get_many(self, symbols, max_workers=8):
+        """
+        Return {symbol: info} for many symbols at once.
+        Cached symbols are answered immediately and the misses are fetched concurrently.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        if not symbols:
+            return {}
+
+        def fetch(symbol):
+            try:
+                return self.get_info(symbol)
+            except Exception:
+                return {}
+
+        workers = max(1, min(max_workers, len(symbols)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # Each fetch runs in a copy of the caller's context so per-request timings still see it
+            futures = [pool.submit(contextvars.copy_context().run, fetch, symbol) for symbol in symbols]
+            return {symbol: future.result() for symbol, future in zip(symbols, futures)}
+
+    def invalidate(self, symbol=None):
+        """Drop one symbol, or everything when no symbol is given"""
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol.upper(), None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "symbols": len(self._entries),
+                "max_symbols": self.max_symbols,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import time
+import zlib
+
+from flask import Response, request
+
+from profiling import add_serialize_time
+
+try:
+    import orjson
+except ImportError:  # optional: the stdlib encoder gives the same JSON, only slower
+    orjson = None
+
+# Rows encoded per chunk of a streamed array
+CHUNK_ROWS = 2000
+GZIP_LEVEL = 5
+
+
+def dumps(obj):
+    """
+    JSON bytes; orjson when installed (datetimes come out as ISO 8601 either way).
+    The encoding time shows up in the request's Server-Timing like Flask's own JSON responses.
+    """
+    started = time.perf_counter()
+    if orjson is not None:
+        data = orjson.dumps(obj)
+    else:
+        data = json.dumps(obj, separators=(',', ':'), default=lambda value: value.isoformat()).encode()
+    add_serialize_time(time.perf_counter() - started)
+    return data
+
+
+def json_array_chunks(rows, to_item):
+    """
+    A JSON array of to_item(row) for every row, yielded a chunk of rows at a time,
+    so a large list is never held as one dict list or one encoded string
+    """
+    yield b'['
+    for start in range(0, len(rows), CHUNK_ROWS):
+        chunk = dumps([to_item(row) for row in rows[start:start + CHUNK_ROWS]])
+        yield (b',' if start else b'') + chunk[1:-1]
+    yield b']'
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def gzip_body(body):
+    """A whole body gzipped as json_stream would send it"""
+    return b''.join(_gzip([body]))
+
+
+def make_etag(version):
+    """Weak ETag for a data version; weak because the gzip and plain bodies differ byte-wise"""
+    return hashlib.sha1(str(version).encode()).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """A 304 response when the client already has this version, otherwise None"""
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def json_stream(chunks, etag=None, status=200, gzipped=None):
+    """
+    Streamed JSON response from byte chunks, gzipped when the client accepts it.
+    gzipped() can supply the compressed body instead (e.g. kept in a cache) so it isn't compressed again.
+    With an etag the client can revalidate (If-None-Match) and get a 304 instead of the body.
+    """
+    gzip = 'gzip' in request.accept_encodings
+    if gzip:
+        chunks = [gzipped()] if gzipped else _gzip(chunks)
+    response = Response(chunks, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if gzip:
+        response.content_encoding = 'gzip'
+    if etag:
+        response.set_etag(etag, weak=True)
+        response.cache_control.no_cache = True
+    return response
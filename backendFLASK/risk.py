@@ -0,0 +1,189 @@
+import threading
+from collections import OrderedDict
+from statistics import NormalDist
+
+import numpy as np
+
+from cache import current_version
+from performance import holdings_as_of, portfolio_value_series
+from price_store import CloseMatrix
+
+TRADING_DAYS = 252
+DEFAULT_BENCHMARK = 'SPY'
+RISK_CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Closes stay in memory between calls; only new rows are read from the database
+close_matrix = CloseMatrix()
+
+
+def correlation_matrix(returns):
+    """
+    Correlations between the columns of a dates x symbols returns array with missing days (NaN),
+    as three matrix products instead of a pairwise loop. Each pair uses only the days both have;
+    column means are taken over each column's own days.
+    """
+    mask = ~np.isnan(returns)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(mask, returns, 0.0).sum(axis=0) / mask.sum(axis=0)
+        centered = np.where(mask, returns - means, 0.0)
+        m = mask.astype(float)
+        cross = centered.T @ centered
+        # Sum of squares of column i over the days column j also has, for every pair
+        squares = (centered ** 2).T @ m
+        corr = cross / np.sqrt(squares * squares.T)
+        pairs = m.T @ m
+    corr[pairs < 2] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def max_drawdown(values, dates):
+    """Largest peak-to-trough fall of a value series, with the dates it ran between"""
+    peaks = np.maximum.accumulate(values)
+    drawdowns = np.where(peaks > 0, values / peaks - 1.0, 0.0)
+    trough = int(np.argmin(drawdowns))
+    peak = int(np.argmax(values[:trough + 1]))
+    return {"value": float(drawdowns[trough]), "peak_date": dates[peak], "trough_date": dates[trough]}
+
+
+def value_at_risk(returns, value, confidence):
+    """One-day VaR as a positive fraction and dollar amount: historical (empirical quantile) and parametric (normal)"""
+    historical = -float(np.quantile(returns, 1 - confidence))
+    z = NormalDist().inv_cdf(1 - confidence)
+    parametric = -float(returns.mean() + z * returns.std(ddof=1))
+    return {
+        "confidence": confidence,
+        "horizon_days": 1,
+        "historical": {"pct": _clean(historical), "amount": round(historical * value, 2)},
+        "parametric": {"pct": _clean(parametric), "amount": round(parametric * value, 2)}
+    }
+
+
+def column_betas(returns, benchmark):
+    """
+    Beta of every column of a dates x symbols returns array against the benchmark returns,
+    using only the days where both have a return: cov(r, b) / var(b), all columns at once
+    """
+    mask = ~np.isnan(returns) & ~np.isnan(benchmark)[:, None]
+    counts = mask.sum(axis=0)
+    r = np.where(mask, returns, 0.0)
+    b = np.where(mask, benchmark[:, None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r_mean = r.sum(axis=0) / counts
+        b_mean = b.sum(axis=0) / counts
+        cov = (np.where(mask, (r - r_mean) * (b - b_mean), 0.0)).sum(axis=0)
+        var = (np.where(mask, (b - b_mean) ** 2, 0.0)).sum(axis=0)
+        betas = cov / var
+    betas[(counts < 2) | (var == 0)] = np.nan
+    return betas
+
+
+def _clean(value, digits=6):
+    """JSON-safe float: NaN/inf become None"""
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def _clean_array(values, digits=6):
+    """_clean for a whole array at once, as (nested) lists"""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isfinite(values), np.round(values, digits), None).tolist()
+
+
+def compute_risk(account_id, as_of, benchmark=DEFAULT_BENCHMARK, confidence=0.95, risk_free=0.0):
+    """
+    Risk metrics for an account's portfolio as of a day (YYYY-MM-DD). Portfolio-level numbers come from
+    the daily total values; per-position volatility, beta and correlations from the held symbols' closes.
+    """
+    series = [row for row in portfolio_value_series(account_id) if row['date'] <= as_of]
+    result = {"as_of": as_of, "benchmark": benchmark}
+    if len(series) < 2:
+        return {**result, "error": "Not enough history", "returns": [], "positions": [],
+                "correlation": {"symbols": [], "matrix": []}}
+
+    dates = [row['date'] for row in series]
+    values = np.array([row['total_value'] for row in series], dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = values[1:] / values[:-1] - 1.0
+    daily = np.where(np.isfinite(daily), daily, 0.0)
+    cumulative = np.cumprod(1.0 + daily) - 1.0
+
+    mean, std = daily.mean(), daily.std(ddof=1)
+    volatility = std * np.sqrt(TRADING_DAYS)
+    annual_return = mean * TRADING_DAYS
+    sharpe = (annual_return - risk_free) / volatility if volatility > 0 else float('nan')
+
+    # Positions held at the end of the day, valued at their last close on or before it
+    holdings, _ = holdings_as_of(account_id, as_of)
+    symbols = sorted(s for s, qty in holdings.items() if qty > 0)
+    prices = close_matrix.get(symbols + ([benchmark] if benchmark not in symbols else []), end=as_of).ffill()
+    price_returns = prices.pct_change(fill_method=None).iloc[1:]
+    position_returns = price_returns[symbols].to_numpy(dtype=float)
+    benchmark_returns = price_returns[benchmark].to_numpy(dtype=float)
+
+    last_prices = prices[symbols].iloc[-1].to_numpy(dtype=float) if len(prices) else np.full(len(symbols), np.nan)
+    quantities = np.array([holdings[s] for s in symbols], dtype=float)
+    market_values = np.nan_to_num(last_prices * quantities)
+    weights = market_values / market_values.sum() if market_values.sum() > 0 else np.zeros(len(symbols))
+
+    with np.errstate(invalid='ignore'):
+        position_vol = np.nanstd(position_returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS) \
+            if len(position_returns) > 1 else np.full(len(symbols), np.nan)
+    betas = column_betas(position_returns, benchmark_returns) if len(position_returns) \
+        else np.full(len(symbols), np.nan)
+    portfolio_beta = float(np.nansum(weights * betas)) if np.isfinite(betas).any() else float('nan')
+    correlation = correlation_matrix(position_returns)
+
+    result.update({
+        "portfolio": {
+            "start_value": round(float(values[0]), 2),
+            "end_value": round(float(values[-1]), 2),
+            "total_return": _clean(cumulative[-1]),
+            "annualized_return": _clean(annual_return),
+            "annualized_volatility": _clean(volatility),
+            "sharpe_ratio": _clean(sharpe, 4),
+            "risk_free_rate": risk_free,
+            "max_drawdown": {k: _clean(v) if k == 'value' else v for k, v in max_drawdown(values, dates).items()},
+            "beta": _clean(portfolio_beta, 4),
+            "var": value_at_risk(daily, values[-1], confidence)
+        },
+        "returns": [
+            {"date": d, "daily_return": r, "cumulative_return": c}
+            for d, r, c in zip(dates[1:], _clean_array(daily), _clean_array(cumulative))
+        ],
+        "positions": [
+            {"symbol": s, "quantity": int(q), "market_value": round(float(mv), 2), "weight": _clean(w),
+             "annualized_volatility": _clean(v), "beta": _clean(b, 4)}
+            for s, q, mv, w, v, b in zip(symbols, quantities, market_values, weights, position_vol, betas)
+        ],
+        "correlation": {
+            "symbols": symbols,
+            "matrix": _clean_array(correlation, 4)
+        }
+    })
+    if not np.isfinite(benchmark_returns).any():
+        result["warning"] = f"No stored closes for benchmark {benchmark}; run /api/stocks/update to fetch them"
+    return result
+
+
+def portfolio_risk(account_id, as_of, benchmark=DEFAULT_BENCHMARK, confidence=0.95, risk_free=0.0):
+    """
+    compute_risk behind a small LRU cache keyed on (account, as_of, data version, parameters).
+    A repeat call costs the version lookup and a dict hit; the account's trades and any price
+    ingestion bump the version, so stale results are never returned.
+    """
+    version = current_version(account_id)
+    key = (account_id, as_of, version, benchmark, confidence, risk_free)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    result = compute_risk(account_id, as_of, benchmark, confidence, risk_free)
+    result["holdings_version"] = version
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > RISK_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
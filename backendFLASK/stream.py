@@ -0,0 +1,172 @@
+import json
+import queue
+import threading
+import time
+
+
+def format_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def diff_snapshot(old, new):
+    """
+    Fields of `new` that differ from `old`. Holdings are diffed per symbol and a symbol
+    that is no longer held maps to None. Returns {} when nothing changed.
+    """
+    if old is None:
+        return dict(new)
+    diff = {k: v for k, v in new.items() if k != 'holdings' and old.get(k) != v}
+
+    old_holdings, new_holdings = old.get('holdings', {}), new.get('holdings', {})
+    holdings = {s: h for s, h in new_holdings.items() if old_holdings.get(s) != h}
+    holdings.update({s: None for s in old_holdings if s not in new_holdings})
+    if holdings:
+        diff['holdings'] = holdings
+    return diff
+
+
+class Subscriber:
+    """
+    One connected client. Messages wait in a bounded queue; a client that falls behind has its
+    backlog dropped and gets a single fresh snapshot instead (coalescing), so a slow client never
+    holds up the poller or grows memory without bound.
+    """
+
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.needs_snapshot = True
+        self.dropped = 0
+
+    def offer(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            while True:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    break
+            self.needs_snapshot = True
+
+
+class StreamHub:
+    """
+    Fans one shared polling loop out to every subscriber. The loop runs only while someone is
+    subscribed and calls snapshot_fn once per interval, however many clients are connected.
+    """
+
+    def __init__(self, snapshot_fn, interval=15, max_queue=50):
+        self.snapshot_fn = snapshot_fn
+        self.interval = interval
+        self.max_queue = max_queue
+        self.ticks = 0
+        self.last_snapshot = None
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._wake = threading.Event()
+
+    def subscribe(self):
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll, name='stream-poller', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data):
+        """Send an event (e.g. a trade) to every subscriber and refresh the snapshot right away"""
+        message = format_event(event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(message)
+        self._wake.set()
+
+    def next_messages(self, subscriber, timeout):
+        """
+        Messages for one subscriber: a full snapshot if it is new or fell behind, then whatever
+        is queued. Returns [] after `timeout` seconds with nothing to send.
+        """
+        messages = []
+        if subscriber.needs_snapshot and self.last_snapshot is not None:
+            subscriber.needs_snapshot = False
+            messages.append(format_event('snapshot', self.last_snapshot))
+        try:
+            messages.append(subscriber.queue.get(timeout=0 if messages else timeout))
+            while True:
+                messages.append(subscriber.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def tick(self):
+        """One poll: build the snapshot once and send each subscriber only what changed"""
+        snapshot = self.snapshot_fn()
+        self.ticks += 1
+        diff = diff_snapshot(self.last_snapshot, snapshot)
+        self.last_snapshot = snapshot
+        with self._lock:
+            subscribers = list(self._subscribers)
+        message = format_event('update', diff) if diff else None
+        for subscriber in subscribers:
+            if subscriber.needs_snapshot:
+                # New or lagging clients get the whole state instead of a diff against nothing
+                subscriber.needs_snapshot = False
+                subscriber.offer(format_event('snapshot', snapshot))
+            elif message:
+                subscriber.offer(message)
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Stop polling upstream once the last client leaves
+                    self._thread = None
+                    return
+            started = time.monotonic()
+            try:
+                self.tick()
+            except Exception:
+                # A failed upstream poll shouldn't kill the stream; try again next interval
+                pass
+            self._wake.wait(max(0.0, self.interval - (time.monotonic() - started)))
+            self._wake.clear()
+
+
+class StreamHubs:
+    """
+    One StreamHub per account, created on first use. Each polls only while it has subscribers,
+    so idle accounts cost nothing; quotes still come from the shared quote cache.
+    """
+
+    def __init__(self, snapshot_fn, **options):
+        self.snapshot_fn = snapshot_fn  # snapshot_fn(account_id)
+        self.options = options
+        self._hubs = {}
+        self._lock = threading.Lock()
+
+    def get(self, account_id):
+        with self._lock:
+            hub = self._hubs.get(account_id)
+            if hub is None:
+                hub = self._hubs[account_id] = StreamHub(lambda: self.snapshot_fn(account_id), **self.options)
+            return hub
+
+    def publish(self, account_id, event, data):
+        """Send an event to the account's subscribers, if anyone is listening"""
+        with self._lock:
+            hub = self._hubs.get(account_id)
+        if hub is not None:
+            hub.publish(event, data)
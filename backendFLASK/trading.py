@@ -0,0 +1,146 @@
+import random
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from cache import account_key, bump_version
+from models import db, Account, Stock, Transactions
+from ledger import record_buy, record_sell
+
+
+class TradeError(Exception):
+    """A trade that can't be filled (insufficient funds or shares); the routes turn it into a 400"""
+
+
+def adjust_balance(account, amount):
+    """
+    Atomically add amount (negative to debit) to the account balance.
+    A debit only succeeds if it leaves the balance >= 0, checked inside the UPDATE itself
+    so two concurrent buys can't both pass the funds check.
+    """
+    query = Account.query.filter(Account.id == account.id)
+    if amount < 0:
+        query = query.filter(Account.balance >= -amount)
+    if not query.update({Account.balance: Account.balance + amount}, synchronize_session=False):
+        db.session.refresh(account)
+        raise TradeError(f"Insufficient funds. Cost: ${-amount:.2f}, Available: ${account.balance:.2f}")
+    db.session.refresh(account)
+
+
+def run_with_retry(operation, attempts=5, backoff=0.01):
+    """
+    Run a trade and commit it, retrying from scratch when another worker got there first
+    (SQLite 'database is locked', or a unique-index race on a new holding).
+    TradeError is not retried: the trade is simply not fillable.
+    """
+    for attempt in range(attempts):
+        try:
+            result = operation()
+            db.session.commit()
+            return result
+        except TradeError:
+            db.session.rollback()
+            raise
+        except (OperationalError, IntegrityError) as e:
+            db.session.rollback()
+            retryable = isinstance(e, IntegrityError) or 'locked' in str(e) or 'busy' in str(e)
+            if not retryable or attempt == attempts - 1:
+                raise
+            time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+def apply_buy(account, symbol, quantity, price, name='', settle_cash=True):
+    """
+    Apply a BUY to the session without committing: debit the account, add to (or open) the
+    holding with a weighted average purchase price, and record the transaction and its tax lot.
+    With settle_cash=False the caller has already moved the cash (batch orders).
+    Returns (stock, transaction, message).
+    """
+    total_cost = price * quantity
+    if settle_cash:
+        # Debit first so the write lock is held for the rest of the trade
+        adjust_balance(account, -total_cost)
+
+    # Weighted average and quantity are computed in SQL from the current row, not a stale read
+    values = {
+        Stock.purchase_price: (Stock.quantity * Stock.purchase_price + total_cost) / (Stock.quantity + quantity),
+        Stock.quantity: Stock.quantity + quantity
+    }
+    if name:
+        values[Stock.name] = name
+    holding = Stock.query.filter_by(account_id=account.id, symbol=symbol)
+    updated = holding.update(values, synchronize_session=False)
+
+    if updated:
+        stock = holding.populate_existing().first()
+        message = f"Updated stock '{symbol}', new quantity: {stock.quantity}"
+    else:
+        stock = Stock(
+            account_id=account.id,
+            symbol=symbol,
+            purchase_price=price,
+            quantity=quantity,
+            name=name
+        )
+        db.session.add(stock)
+        message = f"Added new stock '{symbol}' with quantity {quantity}"
+
+    transaction = Transactions(
+        account_id=account.id,
+        symbol=symbol,
+        type='BUY',
+        quantity=quantity,
+        purchase_price=price,
+        total_amount=total_cost,
+        date=datetime.now(timezone.utc)
+    )
+    db.session.add(transaction)
+    db.session.flush()
+    record_buy(transaction)
+    bump_version(account_key(account.id))
+    return stock, transaction, message
+
+
+def apply_sell(account, stock, quantity, price, settle_cash=True):
+    """
+    Apply a SELL to the session without committing: reduce (or close) the holding, credit the
+    account, and record the transaction and the FIFO lot sales.
+    Returns (transaction, profit_loss against the average cost, FIFO realized P&L, position_closed).
+    """
+    symbol = stock.symbol
+
+    # Only sells shares that are still there when the UPDATE runs
+    updated = Stock.query.filter(Stock.id == stock.id, Stock.quantity >= quantity) \
+        .update({Stock.quantity: Stock.quantity - quantity}, synchronize_session=False)
+    if not updated:
+        raise TradeError(f"Cannot sell {quantity} units of '{symbol}'; not enough shares available")
+    db.session.refresh(stock)
+
+    sale_proceeds = price * quantity
+    if settle_cash:
+        adjust_balance(account, sale_proceeds)
+
+    # Calculate profit/loss
+    purchase_cost = stock.purchase_price * quantity
+    profit_loss = sale_proceeds - purchase_cost
+
+    transaction = Transactions(
+        account_id=account.id,
+        symbol=symbol,
+        type='SELL',
+        quantity=quantity,
+        purchase_price=price,
+        total_amount=sale_proceeds,
+        date=datetime.now(timezone.utc)
+    )
+    db.session.add(transaction)
+    db.session.flush()
+    realized_pnl = record_sell(transaction)
+    bump_version(account_key(account.id))
+
+    position_closed = stock.quantity == 0
+    if position_closed:
+        # Selling all shares - remove from portfolio
+        db.session.delete(stock)
+    return transaction, profit_loss, realized_pnl, position_closed
@@ -0,0 +1,61 @@
+import threading
+from datetime import datetime
+
+from jobs import try_acquire, report_progress, finish, get_status, utcnow
+from models import db
+from price_store import price_start_dates, refresh_prices
+
+WARMUP_JOB = 'price_warmup'
+
+
+def warm_prices(symbols, owner, download, chunk_size=50, lease=600, hold=3600):
+    """
+    Fill the missing closing prices for the symbols in chunks with download (a provider's closes),
+    recording progress on the lock row.
+    Only one worker runs it; the others return False straight away.
+    After success the lock is held for `hold` seconds so restarts in that window skip the download.
+    """
+    if not try_acquire(WARMUP_JOB, owner, lease):
+        return False
+
+    try:
+        total = len(symbols)
+        report_progress(WARMUP_JOB, owner, 0, total, lease)
+        errors = []
+
+        for start in range(0, total, chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            summary = refresh_prices(price_start_dates(chunk), download=download)
+            errors += summary["errors"]
+            db.session.commit()
+            report_progress(WARMUP_JOB, owner, min(start + chunk_size, total), total, lease)
+
+        if errors:
+            finish(WARMUP_JOB, owner, 'failed', message='; '.join(errors)[:200])
+            return True
+        finish(WARMUP_JOB, owner, 'done', hold=hold)
+    except Exception as e:
+        db.session.rollback()
+        finish(WARMUP_JOB, owner, 'failed', message=str(e)[:200])
+    return True
+
+
+def start_warmup(app, symbols, owner, **kwargs):
+    """Run warm_prices on a daemon thread so the API can serve requests while prices download"""
+    def run():
+        with app.app_context():
+            warm_prices(symbols, owner, **kwargs)
+
+    thread = threading.Thread(target=run, name='price-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def warmup_status():
+    """Warm-up progress as seen by any worker, and whether the API is ready"""
+    status = get_status(WARMUP_JOB)
+    if status and status['status'] == 'running' and datetime.fromisoformat(status['expires_at']) < utcnow():
+        # The worker running it stopped without finishing; the next one to start takes the lease over
+        status = {**status, "status": 'failed', "message": 'Lease expired before the warm-up finished'}
+    ready = status is None or status['status'] != 'running'
+    return {"ready": ready, "warmup": status}
@@ -7,18 +7,46 @@ const GraphContainer = ({ refreshKey }) => {
   const [portfolioData, setPortfolioData] = useState([]);
   
   useEffect(() => {
-    const PortfolioData = async () => {
-    try {
-      await fetch('http://127.0.0.1:5050/api/stocks/update', { method: 'POST' });
-      
+    let pollTimer = null;
+
+    const fetchPortfolioValue = async () => {
       const response = await fetch('http://127.0.0.1:5050/api/portfolio/value');
       const data = await response.json();
       setPortfolioData(data);
+    };
+
+    // Price history downloads in the background; redraw once the job finishes
+    const pollJob = (jobId) => {
+      pollTimer = setTimeout(async () => {
+        try {
+          const response = await fetch(`http://127.0.0.1:5050/api/jobs/${jobId}`);
+          const job = await response.json();
+          if (job.status === 'done') {
+            await fetchPortfolioValue();
+          } else if (job.status === 'queued' || job.status === 'running') {
+            pollJob(jobId);
+          }
+        } catch (err) {
+          console.error('Failure checking price refresh job');
+        }
+      }, 1000);
+    };
+
+    const PortfolioData = async () => {
+    try {
+      const updateResponse = await fetch('http://127.0.0.1:5050/api/stocks/update', { method: 'POST' });
+      const update = await updateResponse.json();
+
+      await fetchPortfolioValue();
+      if (update.job_id && update.status !== 'done') {
+        pollJob(update.job_id);
+      }
     } catch (err) {
       console.error('Failure fetching portfolio data for graph');
     }
   };
   PortfolioData();
+  return () => clearTimeout(pollTimer);
   }, [refreshKey]);
 
   const chartRef = useRef(null);
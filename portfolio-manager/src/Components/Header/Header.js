@@ -14,43 +14,39 @@ const Header = ({ refreshKey }) => {
         fetchAccountInfo();
     }, [refreshKey]); // Refresh when refreshKey changes
 
+    useEffect(() => {
+        // Live balance and valuation pushed by the server instead of polling
+        const source = new EventSource('http://127.0.0.1:5050/api/stream');
+        const applyUpdate = (event) => {
+            const data = JSON.parse(event.data);
+            setAccountInfo(prev => ({
+                ...prev,
+                balance: data.balance ?? prev.balance,
+                totalInvested: data.total_invested ?? prev.totalInvested,
+                totalValue: data.total_value ?? prev.totalValue
+            }));
+        };
+        source.addEventListener('snapshot', applyUpdate);
+        source.addEventListener('update', applyUpdate);
+        return () => source.close();
+    }, []);
+
     const fetchAccountInfo = async () => {
         try {
             // Fetch account balance
             const accountResponse = await fetch('http://127.0.0.1:5050/api/account');
             const accountData = await accountResponse.json();
             
-            // Fetch all stocks to calculate invested amount
-            const stocksResponse = await fetch('http://127.0.0.1:5050/api/stocks');
-            const stocksData = await stocksResponse.json();
+            // Fetch all holdings marked to market in one request
+            const quotesResponse = await fetch('http://127.0.0.1:5050/api/quotes');
+            const quotesData = await quotesResponse.json();
             
             // Fetch realized P&L from completed transactions
             const realizedPnLResponse = await fetch('http://127.0.0.1:5050/api/portfolio/realized-pnl');
             const realizedPnLData = await realizedPnLResponse.json();
-            
-            // Calculate total invested amount using simple for loop for clarity
-            let totalInvested = 0;
-            for (const stock of stocksData) {
-                totalInvested += (stock.purchase_price * stock.quantity);
-            }
 
-            // Calculate current total value by fetching current prices
-            let totalCurrentValue = 0;
-            for (const stock of stocksData) {
-                try {
-                    const priceResponse = await fetch(`http://127.0.0.1:5050/api/search/${stock.symbol}`);
-                    const priceData = await priceResponse.json();
-                    if (priceResponse.ok) {
-                        totalCurrentValue += priceData.current_price * stock.quantity;
-                    } else {
-                        // Fallback to purchase price if current price unavailable
-                        totalCurrentValue += stock.purchase_price * stock.quantity;
-                    }
-                } catch {
-                    // Fallback to purchase price if API fails
-                    totalCurrentValue += stock.purchase_price * stock.quantity;
-                }
-            }
+            const totalInvested = quotesResponse.ok ? quotesData.total_invested : 0;
+            const totalCurrentValue = quotesResponse.ok ? quotesData.total_value : 0;
 
             setAccountInfo({
                 balance: accountData.balance,
@@ -3,6 +3,8 @@ import './TransactionContainer.css';
 
 const TransactionContainer = ({ refreshKey }) => {
     const [transactions, setTransactions] = useState([]);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
 
@@ -12,7 +14,8 @@ const TransactionContainer = ({ refreshKey }) => {
             const response = await fetch('http://127.0.0.1:5050/api/transactions');
             if (response.ok) {
                 const data = await response.json();
-                setTransactions(data);
+                setTransactions(data.transactions);
+                setNextCursor(data.next_cursor);
             } else {
                 setError('Failed to fetch transaction history');
             }
@@ -24,6 +27,31 @@ const TransactionContainer = ({ refreshKey }) => {
         }
     };
 
+    // Load the next page when the list is scrolled near the bottom
+    const fetchMoreTransactions = async () => {
+        if (!nextCursor || loadingMore) return;
+        try {
+            setLoadingMore(true);
+            const response = await fetch(`http://127.0.0.1:5050/api/transactions?cursor=${encodeURIComponent(nextCursor)}`);
+            if (response.ok) {
+                const data = await response.json();
+                setTransactions(prev => [...prev, ...data.transactions]);
+                setNextCursor(data.next_cursor);
+            }
+        } catch (err) {
+            console.error('Error fetching more transactions:', err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
+    const handleScroll = (e) => {
+        const { scrollTop, scrollHeight, clientHeight } = e.target;
+        if (scrollHeight - scrollTop - clientHeight < 100) {
+            fetchMoreTransactions();
+        }
+    };
+
     // Function to refresh transactions
     const refreshTransactions = useCallback(() => {
         fetchTransactions();
@@ -76,7 +104,7 @@ const TransactionContainer = ({ refreshKey }) => {
         <div className="transactions-container">
             <div className="transactions-header">
                 <h3>Transaction History</h3>
-                <div className="transaction-count">{transactions.length} transactions</div>
+                <div className="transaction-count">{transactions.length}{nextCursor ? '+' : ''} transactions</div>
             </div>
             
             {transactions.length === 0 ? (
@@ -85,7 +113,7 @@ const TransactionContainer = ({ refreshKey }) => {
                     <p>Start buying stocks to see your transaction history here!</p>
                 </div>
             ) : (
-                <div className="transactions-list">
+                <div className="transactions-list" onScroll={handleScroll}>
                     {transactions.map((transaction) => (
                         <div key={transaction.id} className="transaction-item">
                             <div className="transaction-main">
@@ -117,6 +145,7 @@ const TransactionContainer = ({ refreshKey }) => {
                             </div>
                         </div>
                     ))}
+                    {loadingMore && <div className="loading">Loading more...</div>}
                 </div>
             )}
         </div>